@@ -1,53 +1,116 @@
 from __future__ import annotations
 
+import json
 from typing import List, Optional
 
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.models.lite_llm import LiteLlm  # For multi-model support
 from google.adk.agents import Agent
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.tools.agent_tool import AgentTool
+from google.adk.tools.tool_context import ToolContext
 from google.genai import types as genai_types
 
 from .config import get_settings
-from .email_service import send_escalation_email
+from .email_service import enqueue_escalation_email
+from .llm import configure_http_client, get_model
 from .conversation_manager import get_conversation_messages
 from .mock_db import (
-    list_activities,
+    search_activities,
     get_activity,
+    get_variation,
     create_booking,
     create_escalation,
+    save_escalation,
 )
 from .models import BookingStatus
+from .sessions import build_session_service
+from .storage import call_store
+from .tool_cache import TOOL_CACHE, cached_tool
+from .tool_execution import serialized_tool
+
+
+# Activity fields a caller may project with ``fields``.
+ACTIVITY_FIELDS = (
+    "id",
+    "name",
+    "description",
+    "images",
+    "variations",
+    "cancellation_policy",
+    "reschedule_policy",
+)
 
 
-def search_activities_tool(query: str) -> dict:
-    """Search available Dubai activities by name or description."""
-    activities = list_activities()
-    q = query.lower()
-    results = [
-        a.dict()
-        for a in activities
-        if q in a.name.lower() or q in a.description.lower()
-    ]
-    return {"status": "success", "results": results}
+def _estimate_tokens(payload: dict) -> int:
+    """Rough prompt-token cost of a tool payload (~4 characters per token)."""
+    return len(json.dumps(payload, separators=(",", ":"), default=str)) // 4 + 1
+
+
+def _with_token_estimate(payload: dict) -> dict:
+    payload["estimated_tokens"] = _estimate_tokens(payload)
+    return payload
+
+
+def _activity_summary(activity, score: float) -> dict:
+    """Compact search hit: enough to pick an activity, not to describe it."""
+    prices = [v.price_per_person for v in activity.variations]
+    return {
+        "id": activity.id,
+        "name": activity.name,
+        "price_from": min(prices) if prices else None,
+        "currency": activity.variations[0].currency if activity.variations else None,
+        "variations": len(activity.variations),
+        "available": any(v.is_available for v in activity.variations),
+        "score": round(score, 3),
+    }
+
+
+@cached_tool
+def search_activities_tool(query: str, limit: int = 5, cursor: Optional[str] = None) -> dict:
+    """Search available Dubai activities by name or description.
+
+    Words may appear in any order and partial words match. Returns compact,
+    relevance-ranked summaries (id, name, starting price); use
+    get_activity_details_tool for images, policies and variations. Pass the
+    returned ``next_cursor`` as ``cursor`` to get the next page.
+    """
+    offset = int(cursor) if cursor and cursor.isdigit() else 0
+    limit = max(1, min(limit, 20))
+    hits = search_activities(query, limit=offset + limit + 1)
+    page = hits[offset:offset + limit]
+    has_more = len(hits) > offset + limit
+    return _with_token_estimate({
+        "status": "success",
+        "results": [_activity_summary(a, score) for a, score in page],
+        "next_cursor": str(offset + limit) if has_more else None,
+    })
+
 
+@cached_tool
+def get_activity_details_tool(activity_id: str, fields: Optional[List[str]] = None) -> dict:
+    """Return full details, images, and policies for a specific activity.
 
-def get_activity_details_tool(activity_id: str) -> dict:
-    """Return full details, images, and policies for a specific activity."""
+    ``fields`` optionally restricts the result to a subset of: id, name,
+    description, images, variations, cancellation_policy, reschedule_policy.
+    """
     activity = get_activity(activity_id)
     if not activity:
         return {"status": "error", "error_message": "Activity not found."}
-    return {"status": "success", "activity": activity.dict()}
+    selected = [f for f in fields or ACTIVITY_FIELDS if f in ACTIVITY_FIELDS] or list(ACTIVITY_FIELDS)
+    if "id" not in selected:
+        selected.insert(0, "id")
+    return _with_token_estimate({
+        "status": "success",
+        "activity": activity.dict(include=set(selected)),
+    })
 
 
+@cached_tool
 def get_pricing_for_variation_tool(activity_id: str, variation_id: str) -> dict:
     """Return pricing and capacity for a specific activity variation."""
-    activity = get_activity(activity_id)
-    if not activity:
+    if not get_activity(activity_id):
         return {"status": "error", "error_message": "Activity not found."}
-    variation = next((v for v in activity.variations if v.id == variation_id), None)
+    variation = get_variation(activity_id, variation_id)
     if not variation:
         return {"status": "error", "error_message": "Variation not found."}
     return {
@@ -57,22 +120,38 @@ def get_pricing_for_variation_tool(activity_id: str, variation_id: str) -> dict:
     }
 
 
-def escalate_to_supervisor_tool(
-    conversation_id: str,
+@serialized_tool
+async def escalate_to_supervisor_tool(
     user_request: str,
+    tool_context: ToolContext,
     subject: str | None = None,
 ) -> dict:
     print("ESCALATE TOOL EXECUTED")
 
     settings = get_settings()
+    # The ADK session id is the conversation id; the model cannot know it.
+    conversation_id = tool_context.session.id
+
+    escalation = await call_store(
+        create_escalation,
+        booking=None,
+        reason=user_request,
+        supervisor_email=settings.supervisor_email or "unknown@local",
+        conversation_id=conversation_id,
+    )
 
-    subj = subject or (
+    # The tags stay even with a custom subject: the IMAP poller filters on the
+    # first one and routes replies with the others.
+    subj = (
         "[Dubai Travel Assistant]"
         "[type=human_escalation]"
         f"[conversation_id={conversation_id}]"
+        f"[escalation_id={escalation.id}]"
     )
+    if subject:
+        subj = f"{subj} {subject}"
 
-    msgs = get_conversation_messages(conversation_id)
+    msgs = await get_conversation_messages(conversation_id)
     transcript_lines = []
     for m in msgs[-20:]:
         transcript_lines.append(f"{m.role.value}: {m.text}")
@@ -86,11 +165,14 @@ def escalate_to_supervisor_tool(
         f"{transcript}\n"
     )
 
-    send_escalation_email(
+    # Delivered by the background outbox; the turn does not wait on SMTP.
+    # The Message-ID lets the supervisor's reply be matched back to this chat.
+    escalation.message_id = enqueue_escalation_email(
         subject=subj,
         body=body,
         to_email=settings.supervisor_email,
     )
+    await call_store(save_escalation, escalation)
 
     return {
         "status": "success",
@@ -101,13 +183,15 @@ def escalate_to_supervisor_tool(
     }
 
 
-def book_activity_tool(
+@serialized_tool
+async def book_activity_tool(
     activity_id: str,
     variation_id: str,
     customer_name: str,
     customer_email: str,
     group_size: int,
     date: str,
+    tool_context: ToolContext,
 ) -> dict:
     """Attempt to create a booking for a given activity and variation.
 
@@ -120,7 +204,7 @@ def book_activity_tool(
     if not activity:
         return {"status": "error", "error_message": "Activity not found."}
 
-    variation = next((v for v in activity.variations if v.id == variation_id), None)
+    variation = get_variation(activity_id, variation_id)
     if not variation:
         return {"status": "error", "error_message": "Variation not found."}
 
@@ -139,7 +223,8 @@ def book_activity_tool(
         )
 
     if needs_escalation:
-        booking = create_booking(
+        booking = await call_store(
+            create_booking,
             activity_id=activity_id,
             variation_id=variation_id,
             customer_name=customer_name,
@@ -150,13 +235,19 @@ def book_activity_tool(
         )
 
         reason = " ".join(reason_parts) or "Supervisor approval required."
-        escalation = create_escalation(
+        escalation = await call_store(
+            create_escalation,
             booking=booking,
             reason=reason,
             supervisor_email=settings.supervisor_email or "unknown@local",
+            # The ADK session id is the conversation id.
+            conversation_id=tool_context.session.id,
         )
 
-        subject = f"[Dubai Travel Assistant] Escalation for booking {booking.id}"
+        subject = (
+            f"[Dubai Travel Assistant] Escalation for booking {booking.id} "
+            f"[conversation_id={escalation.conversation_id}][escalation_id={escalation.id}]"
+        )
         body = (
             f"A booking requires your attention.\n\n"
             f"Booking ID: {booking.id}\n"
@@ -169,7 +260,12 @@ def book_activity_tool(
             f"Please reply with APPROVE or REJECT and any notes. "
             f"Your response will be surfaced to the user in the chat."
         )
-        send_escalation_email(subject=subject, body=body, to_email=escalation.supervisor_email)
+        escalation.message_id = enqueue_escalation_email(
+            subject=subject,
+            body=body,
+            to_email=escalation.supervisor_email,
+        )
+        await call_store(save_escalation, escalation)
 
         return {
             "status": "pending_supervisor",
@@ -181,7 +277,8 @@ def book_activity_tool(
             ),
         }
 
-    booking = create_booking(
+    booking = await call_store(
+        create_booking,
         activity_id=activity_id,
         variation_id=variation_id,
         customer_name=customer_name,
@@ -197,20 +294,52 @@ def book_activity_tool(
     }
 
 
-def build_agents() -> tuple[LlmAgent, Runner]:
-    """Construct the information, booking, and conversation handler agents and runner."""
-    settings = get_settings()
+IMAGE_URL_RULE = (
+    "When providing activity details, you MUST include available image URLs and output ONLY the raw URLs "
+    "(no markdown, no ![text](url), no descriptions, no brackets), with each URL on its own line placed "
+    "at the very end of the message after a blank line."
+)
 
+# How the root agent reaches the specialists in each topology.
+ROUTING_HINTS = {
+    "nested": ("use the information tools", "use the booking tools"),
+    "transfer": ("transfer to `information_agent`", "transfer to `booking_agent`"),
+    "single": ("use the search, details and pricing tools", "use `book_activity_tool`"),
+}
+
+
+def _root_instruction(topology: str) -> str:
+    information_hint, booking_hint = ROUTING_HINTS[topology]
+    return (
+        "You are a friendly WhatsApp-style travel assistant focused on Dubai activities. "
+        "You can do two main things:\n"
+        "1) Provide information (images, pricing, policies) about activities.\n"
+        "2) Help the user book activities, including handling different time slots and group sizes.\n\n"
+        "Guidelines:\n"
+        f"- If the user is asking general questions or wants to compare options, {information_hint}.\n"
+        f"- {IMAGE_URL_RULE}\n"
+        f"- If the user clearly wants to book or reserve, {booking_hint}.\n"
+        "- The user may send several short messages in a row; treat them as a single request.\n"
+        "- Always confirm details back to the user in natural language.\n"
+        "- If the user asks for a manager/supervisor/human, you MUST call `escalate_to_supervisor_tool`.\n"
+        "- If the user ask for extra offers or discounts, you should also call `escalate_to_supervisor_tool` to trigger a human review.\n"
+        "- NEVER claim an escalation was sent unless `escalate_to_supervisor_tool` returned success.\n"
+        "- When a booking goes to supervisor review, explain that they will see their reply in this chat."
+    )
+
+
+def _build_information_agent(model) -> Agent:
     # Information agent - focuses on images, policies, and pricing.
-    information_agent = Agent(
-        model=LiteLlm(model=settings.adk_model),
+    return Agent(
+        model=model,
         name="information_agent",
         description="Provides Dubai activity information, images, policies, and pricing.",
         instruction=(
             "You are an information specialist for Dubai attractions. "
             "Use tools to fetch images, cancellation and reschedule policies, and pricing for "
-            "When providing activity details, you MUST include available image URLs and output ONLY the raw URLs (no markdown, no ![text](url), no descriptions, no brackets), with each URL on its own line placed at the very end of the message after a blank line."
-            "different activity variations. Always respond clearly and concisely."
+            "different activity variations. "
+            f"{IMAGE_URL_RULE} "
+            "Always respond clearly and concisely."
         ),
         tools=[
             search_activities_tool,
@@ -219,9 +348,11 @@ def build_agents() -> tuple[LlmAgent, Runner]:
         ],
     )
 
+
+def _build_booking_agent(model) -> Agent:
     # Booking agent - focuses on creating bookings and handling unavailability.
-    booking_agent = Agent(
-        model=LiteLlm(model=settings.adk_model),
+    return Agent(
+        model=model,
         name="booking_agent",
         description="Handles booking requests for Dubai activities, including variations and group sizes.",
         instruction=(
@@ -238,42 +369,64 @@ def build_agents() -> tuple[LlmAgent, Runner]:
         ],
     )
 
+
+def build_agents() -> tuple[LlmAgent, Runner]:
+    """
+    Construct the conversation handler (and its specialists) and the runner.
+
+    ``AGENT_TOPOLOGY`` picks how the root reaches the specialists:
+
+    - ``nested``: specialists are AgentTools; their answer goes back through
+      the root, which writes the reply.
+    - ``transfer``: specialists are sub-agents; the root hands the
+      conversation over and the specialist answers the user directly.
+    - ``single``: one agent holds every tool; no routing hop at all.
+    """
+    settings = get_settings()
+    TOOL_CACHE.maxsize = settings.tool_cache_size
+    configure_http_client(settings)
+    topology = settings.agent_topology
+    if topology not in ROUTING_HINTS:
+        raise ValueError(f"Unknown AGENT_TOPOLOGY {topology!r}; expected one of {sorted(ROUTING_HINTS)}")
+
+    catalog_tools = [
+        search_activities_tool,
+        get_activity_details_tool,
+        get_pricing_for_variation_tool,
+    ]
+    tools: list = []
+    sub_agents: list = []
+    if topology == "nested":
+        tools = [
+            AgentTool(agent=_build_information_agent(get_model(settings, "information"))),
+            AgentTool(agent=_build_booking_agent(get_model(settings, "booking"))),
+            *catalog_tools,
+            book_activity_tool,
+            escalate_to_supervisor_tool,
+        ]
+    elif topology == "transfer":
+        sub_agents = [
+            _build_information_agent(get_model(settings, "information")),
+            _build_booking_agent(get_model(settings, "booking")),
+        ]
+        tools = [escalate_to_supervisor_tool]
+    else:
+        tools = [*catalog_tools, book_activity_tool, escalate_to_supervisor_tool]
+
     # Conversation handler / root agent.
     root_agent = LlmAgent(
-        model=LiteLlm(model=settings.adk_model),
+        model=get_model(settings, "router"),
         name="conversation_handler",
         description=(
             "WhatsApp-style travel assistant for booking and learning about Dubai activities. "
             "Understands multi-turn conversations and message interruptions."
         ),
-        instruction=(
-            "You are a friendly WhatsApp-style travel assistant focused on Dubai activities. "
-            "You can do two main things:\n"
-            "1) Provide information (images, pricing, policies) about activities.\n"
-            "2) Help the user book activities, including handling different time slots and group sizes.\n\n"
-            "Guidelines:\n"
-            "- If the user is asking general questions or wants to compare options, use the information tools.\n"
-            "- When providing activity details, you MUST include available image URLs and output ONLY the raw URLs (no markdown, no ![text](url), no descriptions, no brackets), with each URL on its own line placed at the very end of the message after a blank line."
-            "- If the user clearly wants to book or reserve, use the booking tools.\n"
-            "- The user may send several short messages in a row; treat them as a single request.\n"
-            "- Always confirm details back to the user in natural language.\n"
-            "- If the user asks for a manager/supervisor/human, you MUST call `escalate_to_supervisor_tool`.\n"
-            "- If the user ask for extra offers or discounts, you should also call `escalate_to_supervisor_tool` to trigger a human review.\n"
-            "- NEVER claim an escalation was sent unless `escalate_to_supervisor_tool` returned success.\n"
-            "- When a booking goes to supervisor review, explain that they will see their reply in this chat."
-        ),
-        tools=[
-            AgentTool(agent=information_agent),
-            AgentTool(agent=booking_agent),
-            search_activities_tool,
-            get_activity_details_tool,
-            get_pricing_for_variation_tool,
-            book_activity_tool,
-            escalate_to_supervisor_tool,
-        ],
+        instruction=_root_instruction(topology),
+        tools=tools,
+        sub_agents=sub_agents,
     )
 
-    session_service = InMemorySessionService()
+    session_service = build_session_service()
     runner = Runner(
         agent=root_agent,
         app_name=settings.app_name,
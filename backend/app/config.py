@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import Any, Dict
 from pydantic import Field, ConfigDict
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -13,10 +14,77 @@ class Settings(BaseSettings):
     # Gemini / ADK
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
     adk_model: str = "gpt-4.1-2025-04-14"
+    # Per-agent models; unset falls back to adk_model.
+    router_model: str | None = Field(default=None, env="ROUTER_MODEL")
+    information_model: str | None = Field(default=None, env="INFORMATION_MODEL")
+    booking_model: str | None = Field(default=None, env="BOOKING_MODEL")
+    # Provider call limits, shared defaults for every agent...
+    llm_timeout_seconds: float = Field(default=30.0, env="LLM_TIMEOUT_SECONDS")
+    llm_connect_timeout_seconds: float = Field(default=5.0, env="LLM_CONNECT_TIMEOUT_SECONDS")
+    llm_num_retries: int = Field(default=2, env="LLM_NUM_RETRIES")
+    llm_breaker_failures: int = Field(default=5, env="LLM_BREAKER_FAILURES")
+    llm_breaker_cooldown_seconds: float = Field(default=30.0, env="LLM_BREAKER_COOLDOWN_SECONDS")
+    # ...and per-role overrides as JSON, e.g. {"information": {"timeout_seconds": 10, "num_retries": 1}}
+    llm_role_overrides: Dict[str, Dict[str, Any]] = Field(default_factory=dict, env="LLM_ROLE_OVERRIDES")
+    # Shared, pooled HTTP client for provider calls
+    llm_http2: bool = Field(default=True, env="LLM_HTTP2")
+    llm_max_connections: int = Field(default=100, env="LLM_MAX_CONNECTIONS")
+    llm_max_keepalive_connections: int = Field(default=20, env="LLM_MAX_KEEPALIVE_CONNECTIONS")
+    llm_keepalive_expiry_seconds: float = Field(default=30.0, env="LLM_KEEPALIVE_EXPIRY_SECONDS")
+    # How the root agent reaches its specialists: "nested" (AgentTool), "transfer" (sub-agent handoff) or "single".
+    agent_topology: str = Field(default="nested", env="AGENT_TOPOLOGY")
+    # Stream partial agent output into a draft chat message as it is generated.
+    stream_agent_responses: bool = Field(default=False, env="STREAM_AGENT_RESPONSES")
+    # Answer simple price/policy/photo/listing questions from templates, skipping
+    # the LLM (off by default: replies then differ in wording from the agents').
+    fast_path_enabled: bool = Field(default=False, env="FAST_PATH_ENABLED")
+    # Reuse replies to near-identical informational questions (off by default;
+    # set a size, e.g. 500, to enable).
+    response_cache_size: int = Field(default=0, env="RESPONSE_CACHE_SIZE")
+    response_cache_threshold: float = Field(default=0.85, env="RESPONSE_CACHE_THRESHOLD")
+    response_cache_ttl_seconds: float = Field(default=600.0, env="RESPONSE_CACHE_TTL_SECONDS")
+
+    # Grouping of rapid user messages into a single agent turn (seconds)
+    coalesce_min_delay: float = Field(default=0.05, env="COALESCE_MIN_DELAY")
+    coalesce_idle_timeout: float = Field(default=0.4, env="COALESCE_IDLE_TIMEOUT")
+    coalesce_max_wait: float = Field(default=2.0, env="COALESCE_MAX_WAIT")
+
+    # Persistence: "memory" (process-local) or "sqlite" (shared across workers)
+    storage_backend: str = Field(default="memory", env="STORAGE_BACKEND")
+    sqlite_path: str = Field(default="travel_assistant.db", env="SQLITE_PATH")
+    sqlite_pool_size: int = Field(default=4, env="SQLITE_POOL_SIZE")
+    sqlite_batch_size: int = Field(default=50, env="SQLITE_BATCH_SIZE")
+    sqlite_flush_interval: float = Field(default=0.5, env="SQLITE_FLUSH_INTERVAL")
+    # The memory backend keeps only this much (oldest conversations and
+    # messages are dropped); use sqlite to keep everything.
+    memory_store_max_conversations: int = Field(default=10000, env="MEMORY_STORE_MAX_CONVERSATIONS")
+    memory_store_max_messages: int = Field(default=1000, env="MEMORY_STORE_MAX_MESSAGES")
+
+    # In-process conversation cache (older data is read back from the store)
+    max_cached_conversations: int = Field(default=1000, env="MAX_CACHED_CONVERSATIONS")
+    max_cached_messages: int = Field(default=200, env="MAX_CACHED_MESSAGES")
+    conversation_ttl_seconds: float = Field(default=3600.0, env="CONVERSATION_TTL_SECONDS")
+
+    # ADK session history sent to the model each turn
+    session_db_path: str = Field(default="adk_sessions.db", env="SESSION_DB_PATH")
+    session_max_events: int = Field(default=40, env="SESSION_MAX_EVENTS")
+    session_summarize: bool = Field(default=True, env="SESSION_SUMMARIZE")
+
+    # Upper bound on agent turns running against the LLM provider at once
+    max_concurrent_turns: int = Field(default=8, env="MAX_CONCURRENT_TURNS")
+    # Threads that run synchronous tool calls, so parallel lookups overlap
+    tool_workers: int = Field(default=4, env="TOOL_WORKERS")
+
+    # Memoized results of the read-only catalog tools
+    tool_cache_size: int = Field(default=1024, env="TOOL_CACHE_SIZE")
 
     # CORS / frontend
     frontend_origin: str | None = Field(default=None, env="FRONTEND_ORIGIN")
 
+    # Chat streaming (server-sent events)
+    chat_stream_queue_size: int = Field(default=100, env="CHAT_STREAM_QUEUE_SIZE")
+    chat_stream_keepalive_seconds: float = Field(default=15.0, env="CHAT_STREAM_KEEPALIVE_SECONDS")
+
     # Email escalation (simple SMTP config)
     smtp_host: str | None = Field(default=None, env="SMTP_HOST")
     smtp_port: int | None = Field(default=None, env="SMTP_PORT")
@@ -24,12 +92,36 @@ class Settings(BaseSettings):
     smtp_password: str | None = Field(default=None, env="SMTP_PASSWORD")
     smtp_from_email: str | None = Field(default=None, env="SMTP_FROM_EMAIL")
     supervisor_email: str | None = Field(default=None, env="SUPERVISOR_EMAIL")
+    smtp_timeout_seconds: float = Field(default=30.0, env="SMTP_TIMEOUT_SECONDS")
+    # Background outbox: burst batching, retries and connection reuse
+    email_batch_size: int = Field(default=20, env="EMAIL_BATCH_SIZE")
+    email_batch_window_seconds: float = Field(default=0.2, env="EMAIL_BATCH_WINDOW_SECONDS")
+    email_max_attempts: int = Field(default=5, env="EMAIL_MAX_ATTEMPTS")
+    email_retry_base_delay_seconds: float = Field(default=1.0, env="EMAIL_RETRY_BASE_DELAY_SECONDS")
+    email_idle_timeout_seconds: float = Field(default=30.0, env="EMAIL_IDLE_TIMEOUT_SECONDS")
 
     # IMAP (ADD THIS BLOCK)
     supervisor_imap_host: str | None = Field(default=None, env="SUPERVISOR_IMAP_HOST")
     supervisor_imap_port: int | None = Field(default=None, env="SUPERVISOR_IMAP_PORT")
     supervisor_imap_email: str | None = Field(default=None, env="SUPERVISOR_IMAP_EMAIL")
     supervisor_imap_app_password: str | None = Field(default=None, env="SUPERVISOR_IMAP_APP_PASSWORD")
+    # Watch the supervisor inbox from inside the API process; otherwise run
+    # `python -m app.imap`, which posts replies to BACKEND_BASE_URL.
+    supervisor_imap_enabled: bool = Field(default=False, env="SUPERVISOR_IMAP_ENABLED")
+    imap_ssl: bool = Field(default=True, env="IMAP_SSL")
+    # Fallback polling interval for servers without IDLE
+    imap_poll_seconds: float = Field(default=15.0, env="IMAP_POLL_SECONDS")
+    # Re-issue IDLE this often; servers drop idle sessions after ~30 minutes
+    imap_idle_seconds: float = Field(default=300.0, env="IMAP_IDLE_SECONDS")
+    imap_max_backoff_seconds: float = Field(default=300.0, env="IMAP_MAX_BACKOFF_SECONDS")
+    # Last seen UIDVALIDITY/UID, kept across restarts
+    imap_state_path: str = Field(default="imap_state.json", env="IMAP_STATE_PATH")
+    escalation_subject_tag: str = Field(default="[Dubai Travel Assistant]", env="ESCALATION_SUBJECT_TAG")
+    backend_base_url: str = Field(default="http://127.0.0.1:8000", env="BACKEND_BASE_URL")
+    # Shared secret for the supervisor-reply endpoints. Only requests sending
+    # it as X-Supervisor-Token may change booking or escalation status;
+    # without it replies are injected as chat text only.
+    supervisor_reply_token: str | None = Field(default=None, env="SUPERVISOR_REPLY_TOKEN")
 
     # class Config:
     #     env_file = ".env"
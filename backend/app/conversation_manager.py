@@ -1,13 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import sys
+import time
+from bisect import bisect_right
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
+from google.adk.agents.run_config import RunConfig, StreamingMode, ToolThreadPoolConfig
+from google.adk.events import Event
 from google.genai import types as genai_types
 
-from .models import ChatMessage, ChatRole
+from .fast_path import FAST_PATH_METRICS, try_fast_path
+from .models import ChatRole, MessageRecord
+from .response_cache import READ_ONLY_TOOLS, SemanticResponseCache
+from .storage import call_store, get_store
 from google.adk.errors.already_exists_error import AlreadyExistsError
 
 
@@ -17,19 +25,396 @@ class ConversationState:
     conversation_id: str
     is_processing: bool = False
     pending_texts: List[str] = field(default_factory=list)
+    # Rev of the most recently stored message version.
+    last_rev: int = 0
+    # Set whenever a user message is queued; wakes the coalescing wait.
+    message_arrived: asyncio.Event = field(default_factory=asyncio.Event)
+    first_pending_at: Optional[float] = None
+    last_pending_at: Optional[float] = None
+    # Messages with rev <= cache_floor may exist only in the store.
+    cache_floor: int = 0
+    last_access_at: float = field(default_factory=time.monotonic)
+    # Appends waiting for the store; the conversation stays cached meanwhile.
+    writes_in_flight: int = 0
 
 
-CONVERSATIONS: Dict[str, List[ChatMessage]] = {}
+@dataclass(frozen=True)
+class CachePolicy:
+    """Bounds for the in-process conversation cache.
+
+    Conversations beyond ``max_conversations`` (least recently used first) or
+    idle for ``ttl_seconds`` are dropped from memory, and each cached history
+    keeps only its newest ``max_messages``. Everything stays in the store and
+    is read back on demand.
+    """
+
+    max_conversations: int = 1000
+    max_messages: int = 200
+    ttl_seconds: float = 3600.0
+
+
+@dataclass(frozen=True)
+class CoalescePolicy:
+    """How long to wait for more user messages before starting a turn.
+
+    A turn starts once ``idle_timeout`` seconds pass without a new message,
+    but never before ``min_delay`` and never later than ``max_wait`` after the
+    first pending message arrived.
+    """
+
+    min_delay: float = 0.05
+    idle_timeout: float = 0.4
+    max_wait: float = 2.0
+
+
+@dataclass
+class CoalescingMetrics:
+    turns: int = 0
+    messages: int = 0
+    max_messages_per_turn: int = 0
+    total_delay_seconds: float = 0.0
+    max_delay_seconds: float = 0.0
+
+    def record(self, merged: int, delay: float) -> None:
+        self.turns += 1
+        self.messages += merged
+        self.max_messages_per_turn = max(self.max_messages_per_turn, merged)
+        self.total_delay_seconds += delay
+        self.max_delay_seconds = max(self.max_delay_seconds, delay)
+
+    def as_dict(self) -> dict:
+        turns = self.turns or 1
+        return {
+            "turns": self.turns,
+            "messages": self.messages,
+            "avg_messages_per_turn": self.messages / turns,
+            "max_messages_per_turn": self.max_messages_per_turn,
+            "avg_delay_seconds": self.total_delay_seconds / turns,
+            "max_delay_seconds": self.max_delay_seconds,
+        }
+
+
+@dataclass(eq=False)
+class Subscription:
+    """A live listener for new messages of one conversation.
+
+    Each subscriber owns a bounded queue. When a slow client lets it fill up,
+    the subscription is dropped instead of blocking the publisher; the client
+    is expected to reconnect and resume from its last seen ``rev``.
+    """
+
+    conversation_id: str
+    queue: asyncio.Queue
+    loop: asyncio.AbstractEventLoop
+    dropped: bool = False
+
+
+# Cached histories in least-recently-used order (oldest first). Each
+# history is in rev order, so a changed message moves to its end.
+CONVERSATIONS: "OrderedDict[str, List[MessageRecord]]" = OrderedDict()
 CONVERSATION_STATES: Dict[str, ConversationState] = {}
+SUBSCRIBERS: Dict[str, Set[Subscription]] = {}
+# Seconds between stored versions of a streaming draft.
+DRAFT_SAVE_INTERVAL = 1.0
+# History reads in flight, so concurrent cache misses share one.
+HISTORY_READS: Dict[str, asyncio.Future] = {}
+COALESCING_METRICS = CoalescingMetrics()
+CACHE_POLICY = CachePolicy()
+EVICTED_CONVERSATIONS = 0
+
+
+
+def configure_cache(policy: CachePolicy) -> None:
+    global CACHE_POLICY
+    CACHE_POLICY = policy
+
+
+async def _read_history(conversation_id: str, limit: int) -> List[MessageRecord]:
+    read = HISTORY_READS.get(conversation_id)
+    if read is None:
+        read = HISTORY_READS[conversation_id] = asyncio.ensure_future(
+            call_store(get_store().load_messages, conversation_id, 0, limit)
+        )
+        read.add_done_callback(lambda _: HISTORY_READS.pop(conversation_id, None))
+    return await asyncio.shield(read)
+
+
+async def _load_conversation(
+    conversation_id: str,
+) -> Tuple[List[MessageRecord], ConversationState] | None:
+    """Return the cached history and its state, reading it from the store on a cache miss."""
+    messages = CONVERSATIONS.get(conversation_id)
+    if messages is None:
+        limit = CACHE_POLICY.max_messages
+        stored = await _read_history(conversation_id, limit)
+        # Another caller may have filled the cache while this one waited.
+        messages = CONVERSATIONS.get(conversation_id)
+        if messages is None:
+            if not stored:
+                return None
+            messages = CONVERSATIONS[conversation_id] = stored
+            state = get_or_create_state(conversation_id)
+            state.last_rev = stored[-1].rev
+            state.cache_floor = stored[0].rev - 1 if len(stored) >= limit else 0
+            state.last_access_at = time.monotonic()
+            _evict_idle(keep=conversation_id)
+            return messages, state
+    CONVERSATIONS.move_to_end(conversation_id)
+    state = get_or_create_state(conversation_id)
+    state.last_access_at = time.monotonic()
+    return messages, state
+
+
+def _is_active(conversation_id: str) -> bool:
+    state = CONVERSATION_STATES.get(conversation_id)
+    return bool(
+        SUBSCRIBERS.get(conversation_id)
+        or (state and (state.is_processing or state.pending_texts or state.writes_in_flight))
+    )
+
+
+def _evict_idle(keep: str | None = None) -> None:
+    """
+    Drop least recently used or expired conversations that nobody is using.
+
+    ``keep`` is the conversation the caller is about to use; it is never dropped.
+    """
+    global EVICTED_CONVERSATIONS
+    now = time.monotonic()
+    for conversation_id in list(CONVERSATIONS):
+        over_capacity = len(CONVERSATIONS) > CACHE_POLICY.max_conversations
+        state = CONVERSATION_STATES.get(conversation_id)
+        expired = state is None or now - state.last_access_at > CACHE_POLICY.ttl_seconds
+        if not over_capacity and not expired:
+            # Access order: everything after this entry is newer still.
+            break
+        if conversation_id == keep or _is_active(conversation_id):
+            continue
+        del CONVERSATIONS[conversation_id]
+        CONVERSATION_STATES.pop(conversation_id, None)
+        EVICTED_CONVERSATIONS += 1
+
+
+def _trim_history(state: ConversationState, messages: List[MessageRecord]) -> None:
+    # Trim in chunks so appends do not shift the list every time.
+    cap = CACHE_POLICY.max_messages
+    if len(messages) > cap + cap // 4:
+        drop = len(messages) - cap
+        state.cache_floor = max(state.cache_floor, messages[drop - 1].rev)
+        del messages[:drop]
+
+
+def get_memory_metrics() -> dict:
+    """Approximate memory held by cached conversations."""
+    messages = sum(len(history) for history in CONVERSATIONS.values())
+    approx_bytes = sum(
+        sys.getsizeof(m) + sys.getsizeof(m.text) + (sys.getsizeof(m._json) if m._json else 0)
+        for history in CONVERSATIONS.values()
+        for m in history
+    )
+    return {
+        "cached_conversations": len(CONVERSATIONS),
+        "cached_messages": messages,
+        "conversation_states": len(CONVERSATION_STATES),
+        "approx_bytes": approx_bytes,
+        "evicted_conversations": EVICTED_CONVERSATIONS,
+    }
+
+
+def _cache_stored(
+    state: ConversationState,
+    messages: List[MessageRecord],
+    stored: List[MessageRecord],
+    new: bool = False,
+) -> None:
+    """
+    Add stored messages to the cached history and hand them to subscribers.
+
+    Versions that are already cached (e.g. a message this process wrote and
+    then read back from a shared store) are skipped; a newer version of a
+    cached message replaces it. ``new`` marks a single message of which
+    no older version is cached.
+    """
+    if not stored:
+        return
+    if new and stored[0].rev > state.last_rev:
+        # The common case: one new message, newer than anything cached.
+        messages.append(stored[0])
+        fresh = stored
+    else:
+        cached = {m.id: m.rev for m in messages}
+        fresh = [m for m in stored if cached.get(m.id, -1) < m.rev]
+        if not fresh:
+            return
+        replaced = {m.id for m in fresh if m.id in cached}
+        if replaced:
+            messages[:] = [m for m in messages if m.id not in replaced]
+        messages.extend(fresh)
+        messages.sort(key=lambda m: m.rev)
+    state.last_rev = max(state.last_rev, messages[-1].rev)
+    _trim_history(state, messages)
+    for message in fresh:
+        _publish(message)
+
+
+async def _load_current(
+    conversation_id: str,
+) -> Tuple[List[MessageRecord], ConversationState] | None:
+    """Like ``_load_conversation``, but also catch up with a shared store."""
+    cached = await _load_conversation(conversation_id)
+    store = get_store()
+    if cached is not None and store.shared:
+        messages, state = cached
+        if await call_store(store.last_message_rev, conversation_id) > state.last_rev:
+            stored = await call_store(store.load_messages, conversation_id, state.last_rev)
+            _cache_stored(state, messages, stored)
+    return cached
+
+
+async def get_conversation_messages(conversation_id: str) -> List[MessageRecord]:
+    """Return the cached history in conversation (``seq``) order."""
+    cached = await _load_current(conversation_id)
+    return sorted(cached[0], key=lambda m: m.seq) if cached else []
+
+
+async def get_last_rev(conversation_id: str) -> int:
+    cached = await _load_current(conversation_id)
+    return cached[1].last_rev if cached else 0
+
+
+async def get_messages_since(conversation_id: str, since: int = 0) -> List[MessageRecord]:
+    """
+    Return the messages of a conversation added or changed after rev ``since``.
+
+    Messages are cached in rev order, so an up-to-date cursor is answered
+    without touching the history and a stale one with a binary search.
+    The result is in rev order too; clients order the conversation by ``seq``.
+    """
+    cached = await _load_current(conversation_id)
+    if cached is None:
+        return []
+    messages, state = cached
+    if not messages or since >= state.last_rev:
+        return []
+    if since < state.cache_floor:
+        # Older than what is cached: go to the store.
+        return await call_store(get_store().load_messages, conversation_id, since)
+    if since <= 0:
+        return list(messages)
+    start = bisect_right(messages, since, key=lambda m: m.rev)
+    return messages[start:]
+
+
+async def _store_message(message: MessageRecord, version: MessageRecord) -> None:
+    """Store ``version`` of ``message``, then cache and publish ``message`` with its new rev."""
+    conversation_id = message.conversation_id
+    cached = await _load_conversation(conversation_id)
+    if cached is None:
+        messages = CONVERSATIONS[conversation_id] = []
+        state = get_or_create_state(conversation_id)
+        state.last_access_at = time.monotonic()
+        _evict_idle(keep=conversation_id)
+    else:
+        messages, state = cached
+    # The store hands out seq and rev, so workers sharing it never collide.
+    store = get_store()
+    state.writes_in_flight += 1
+    try:
+        await asyncio.wrap_future(store.append_message(version))
+        if version.rev > state.last_rev + 1:
+            # Other processes stored messages in the meantime.
+            missed = await call_store(store.load_messages, conversation_id, state.last_rev)
+            _cache_stored(state, messages, [m for m in missed if m.rev < version.rev])
+    finally:
+        state.writes_in_flight -= 1
+    if version is not message:
+        # Take the old version out; the new one goes where its rev belongs.
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index].id == message.id:
+                del messages[index]
+                break
+        message.rev = version.rev
+        message.changed()
+    _cache_stored(state, messages, [message], new=True)
+
+
+async def append_message(message: MessageRecord) -> MessageRecord:
+    """Store a new message and add it to the cached history once the store has numbered it."""
+    await _store_message(message, message)
+    return message
+
+
+async def update_message(message: MessageRecord) -> None:
+    """
+    Store a new version of a message that was changed in place (e.g. a streaming draft).
+
+    The message keeps its ``seq``, so it stays where it is in the conversation,
+    and gets a new ``rev``, so cursor-based readers pick the new version up.
+    A copy is stored, so the message may keep changing meanwhile.
+    """
+    message.changed()
+    await _store_message(message, message.copy())
+
 
+def _publish_draft(message: MessageRecord) -> None:
+    """
+    Hand a draft that changed in place to live subscribers without storing it.
+
+    Cheap enough for every streamed chunk: the draft keeps its ``rev``, and
+    cursor-based readers see its text once ``update_message`` stores it.
+    """
+    message.changed()
+    _publish(message)
+
+
+def subscribe(conversation_id: str, max_queue: int = 100) -> Subscription:
+    """Register a listener that receives every message appended from now on."""
+    subscription = Subscription(
+        conversation_id=conversation_id,
+        queue=asyncio.Queue(maxsize=max_queue),
+        loop=asyncio.get_running_loop(),
+    )
+    SUBSCRIBERS.setdefault(conversation_id, set()).add(subscription)
+    return subscription
 
-def get_conversation_messages(conversation_id: str) -> List[ChatMessage]:
-    return CONVERSATIONS.setdefault(conversation_id, [])
+
+def unsubscribe(subscription: Subscription) -> None:
+    subscribers = SUBSCRIBERS.get(subscription.conversation_id)
+    if subscribers is not None:
+        subscribers.discard(subscription)
+        if not subscribers:
+            del SUBSCRIBERS[subscription.conversation_id]
+
+
+def _deliver(subscription: Subscription, message: MessageRecord) -> None:
+    if subscription.dropped:
+        return
+    try:
+        subscription.queue.put_nowait(message)
+    except asyncio.QueueFull:
+        print(f"[Chat] Dropping slow subscriber for conversation {subscription.conversation_id}")
+        subscription.dropped = True
+        unsubscribe(subscription)
 
 
-def append_message(message: ChatMessage) -> None:
-    messages = CONVERSATIONS.setdefault(message.conversation_id, [])
-    messages.append(message)
+def _publish(message: MessageRecord) -> None:
+    """Fan a stored message out to the conversation's subscribers without blocking."""
+    subscribers = SUBSCRIBERS.get(message.conversation_id)
+    if not subscribers:
+        return
+    try:
+        current_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        current_loop = None
+    for subscription in list(subscribers):
+        if subscription.loop is current_loop:
+            _deliver(subscription, message)
+        else:
+            # Appended from a worker thread: hand over to the subscriber's loop.
+            try:
+                subscription.loop.call_soon_threadsafe(_deliver, subscription, message)
+            except RuntimeError:
+                unsubscribe(subscription)
 
 
 def get_or_create_state(conversation_id: str) -> ConversationState:
@@ -38,72 +423,396 @@ def get_or_create_state(conversation_id: str) -> ConversationState:
     return CONVERSATION_STATES[conversation_id]
 
 
-async def process_pending_messages(
+def queue_user_text(conversation_id: str, text: str) -> ConversationState:
+    """Queue a user message for the next agent turn and wake the coalescing wait."""
+    state = get_or_create_state(conversation_id)
+    now = time.monotonic()
+    if not state.pending_texts:
+        state.first_pending_at = now
+    state.last_pending_at = now
+    state.pending_texts.append(text)
+    state.message_arrived.set()
+    return state
+
+
+async def _wait_for_burst(state: ConversationState, policy: CoalescePolicy) -> None:
+    """Block until the current burst of user messages looks complete."""
+    first = state.first_pending_at or time.monotonic()
+    min_remaining = first + policy.min_delay - time.monotonic()
+    if min_remaining > 0:
+        await asyncio.sleep(min_remaining)
+
+    while True:
+        now = time.monotonic()
+        last = state.last_pending_at or first
+        deadline = min(last + policy.idle_timeout, first + policy.max_wait)
+        if deadline <= now:
+            return
+        state.message_arrived.clear()
+        try:
+            await asyncio.wait_for(state.message_arrived.wait(), timeout=deadline - now)
+        except asyncio.TimeoutError:
+            return
+
+
+def get_coalescing_metrics() -> dict:
+    return COALESCING_METRICS.as_dict()
+
+
+async def run_turn(
     conversation_id: str,
+    texts: List[str],
     runner,
     app_name: str,
+    stream: bool = False,
+    fast_path: bool = False,
+    response_cache: SemanticResponseCache | None = None,
+    tool_workers: int = 4,
 ) -> None:
     """
-    Aggregate rapid user messages and send them to the ADK runner as a single turn.
+    Send a batch of user messages to the ADK runner as a single turn.
 
-    This function is designed to be scheduled as a background task by FastAPI.
-    """
-    from google.adk.sessions import InMemorySessionService  # type: ignore
+    With ``stream`` enabled, the reply is surfaced token by token through a
+    draft assistant message instead of only once the whole turn has finished.
+    With ``fast_path`` enabled, simple catalog questions are answered from
+    templates and the runner is skipped for that turn. A ``response_cache``
+    answers repeats of earlier informational questions the same way, and
+    learns from a conversation's opening turn when it only read the catalog.
 
-    state = get_or_create_state(conversation_id)
+    Synchronous tools run on a pool of ``tool_workers`` threads, so the
+    independent lookups of one model step overlap instead of queueing on the
+    event loop.
+    """
     session_service = runner.session_service  # type: ignore[attr-defined]
-    if not isinstance(session_service, InMemorySessionService):
-        # For now we assume the default in-memory implementation.
-        pass
+    aggregated = "\n".join(texts)
+
+    content = genai_types.Content(
+        role="user",
+        parts=[genai_types.Part(text=aggregated)],
+    )
 
+    # Ensure a session exists for this conversation.
+    first_turn = True
     try:
-        while state.pending_texts:
-            # Small delay so that multiple rapid messages are grouped.
-            await asyncio.sleep(0.4)
-
-            # Take a snapshot of all pending messages.
-            texts = list(state.pending_texts)
-            state.pending_texts.clear()
-            aggregated = "\n".join(texts)
-
-            content = genai_types.Content(
-                role="user",
-                parts=[genai_types.Part(text=aggregated)],
+        await session_service.create_session(
+            app_name=app_name,
+            user_id=conversation_id,
+            session_id=conversation_id,
+        )
+    except AlreadyExistsError:
+        first_turn = False
+        if response_cache is not None:
+            session = await session_service.get_session(
+                app_name=app_name,
+                user_id=conversation_id,
+                session_id=conversation_id,
             )
+            first_turn = session is None or not session.events
 
-            # Ensure a session exists for this conversation.
-            try:
-                await session_service.create_session(
-                    app_name=app_name,
-                    user_id=conversation_id,
-                    session_id=conversation_id,
-                )
-            except AlreadyExistsError:
-                pass
+    if fast_path:
+        reply = try_fast_path(aggregated)
+        FAST_PATH_METRICS.record(reply.intents if reply else None)
+        if reply is not None:
+            await _record_local_turn(conversation_id, runner, app_name, content, reply.text)
+            await append_message(MessageRecord(conversation_id, ChatRole.ASSISTANT, reply.text))
+            return
 
-            events = runner.run(
-                user_id=conversation_id,
-                session_id=conversation_id,
-                new_message=content,
+    if response_cache is not None:
+        cached = response_cache.lookup(aggregated)
+        if cached is not None:
+            await _record_local_turn(conversation_id, runner, app_name, content, cached)
+            await append_message(MessageRecord(conversation_id, ChatRole.ASSISTANT, cached))
+            return
+
+    tool_pool = ToolThreadPoolConfig(max_workers=tool_workers)
+    if stream:
+        replies, tools_used = await _run_streaming_turn(
+            conversation_id,
+            runner,
+            content,
+            RunConfig(streaming_mode=StreamingMode.SSE, tool_thread_pool_config=tool_pool),
+        )
+    else:
+        replies, tools_used = [], set()
+        # run_async keeps the event loop free while the model and tools
+        # are working, so other conversations are served meanwhile.
+        events = runner.run_async(
+            user_id=conversation_id,
+            session_id=conversation_id,
+            new_message=content,
+            run_config=RunConfig(tool_thread_pool_config=tool_pool),
+        )
+
+        async for event in events:
+            tools_used.update(call.name for call in event.get_function_calls())
+            if event.is_final_response() and event.content:
+                full_text = _event_text(event)
+                if full_text:
+                    await append_message(MessageRecord(conversation_id, ChatRole.ASSISTANT, full_text))
+                    replies.append(full_text)
+
+    # A reply written with earlier turns in context may quote them (names,
+    # party sizes, bookings), so only replies to an opening turn are shared.
+    if (
+        response_cache is not None
+        and first_turn
+        and len(replies) == 1
+        and tools_used <= READ_ONLY_TOOLS
+    ):
+        response_cache.store(aggregated, replies[0])
+
+
+async def _record_local_turn(
+    conversation_id: str,
+    runner,
+    app_name: str,
+    content: genai_types.Content,
+    reply_text: str,
+) -> None:
+    """Add an exchange answered without the runner to the ADK session, so later turns see it."""
+    session_service = runner.session_service  # type: ignore[attr-defined]
+    session = await session_service.get_session(
+        app_name=app_name,
+        user_id=conversation_id,
+        session_id=conversation_id,
+    )
+    if session is None:
+        return
+    invocation_id = f"fast-path-{Event.new_id()}"
+    await session_service.append_event(
+        session,
+        Event(invocation_id=invocation_id, author="user", content=content),
+    )
+    await session_service.append_event(
+        session,
+        Event(
+            invocation_id=invocation_id,
+            author=runner.agent.name,
+            content=genai_types.Content(role="model", parts=[genai_types.Part(text=reply_text)]),
+        ),
+    )
+
+
+class TurnScheduler:
+    """
+    Schedule agent turns across conversations.
+
+    Every conversation gets at most one worker task, so its turns run strictly
+    one after another. Workers share a semaphore that bounds how many runner
+    turns are in flight at once; waiters are woken in FIFO order and a worker
+    re-queues after each turn, so busy conversations take turns fairly.
+    """
+
+    def __init__(
+        self,
+        runner,
+        app_name: str,
+        max_concurrent_turns: int = 8,
+        stream: bool = False,
+        policy: CoalescePolicy | None = None,
+        fast_path: bool = False,
+        response_cache: SemanticResponseCache | None = None,
+        tool_workers: int = 4,
+    ) -> None:
+        self.runner = runner
+        self.app_name = app_name
+        self.stream = stream
+        self.fast_path = fast_path
+        self.response_cache = response_cache
+        self.tool_workers = tool_workers
+        self.policy = policy or CoalescePolicy()
+        self.max_concurrent_turns = max_concurrent_turns
+        self._slots = asyncio.Semaphore(max_concurrent_turns)
+        self._workers: Dict[str, asyncio.Task] = {}
+        self.waiting_turns = 0
+        self.max_waiting_turns = 0
+        self.in_flight_turns = 0
+        self.completed_turns = 0
+        self.failed_turns = 0
+
+    def submit(self, conversation_id: str, text: str) -> None:
+        """Queue a user message and make sure the conversation has a worker."""
+        queue_user_text(conversation_id, text)
+        self._ensure_worker(conversation_id)
+
+    def _ensure_worker(self, conversation_id: str) -> None:
+        worker = self._workers.get(conversation_id)
+        if worker is None or worker.done():
+            self._workers[conversation_id] = asyncio.create_task(
+                self._run_worker(conversation_id)
             )
 
-            for event in events:
-                if event.is_final_response() and event.content:
-                    text_parts = []
-                    for part in event.content.parts:
-                        if getattr(part, "text", None):
-                            text_parts.append(part.text)
-                    full_text = " ".join(text_parts).strip()
-                    if full_text:
-                        append_message(
-                            ChatMessage(
-                                id=f"assistant-{datetime.utcnow().timestamp()}",
-                                conversation_id=conversation_id,
-                                role=ChatRole.ASSISTANT,
-                                text=full_text,
-                                created_at=datetime.utcnow(),
-                            )
-                        )
-    finally:
-        state.is_processing = False
+    async def _run_worker(self, conversation_id: str) -> None:
+        state = get_or_create_state(conversation_id)
+        state.is_processing = True
+        try:
+            while state.pending_texts:
+                # Wait for the burst to settle so rapid messages are grouped.
+                await _wait_for_burst(state, self.policy)
+
+                self.waiting_turns += 1
+                self.max_waiting_turns = max(self.max_waiting_turns, self.waiting_turns)
+                try:
+                    await self._slots.acquire()
+                finally:
+                    self.waiting_turns -= 1
+
+                self.in_flight_turns += 1
+                try:
+                    # Snapshot after getting a slot, so messages that arrived
+                    # while queued still join this turn.
+                    texts = list(state.pending_texts)
+                    state.pending_texts.clear()
+                    COALESCING_METRICS.record(
+                        merged=len(texts),
+                        delay=time.monotonic() - (state.first_pending_at or time.monotonic()),
+                    )
+                    state.first_pending_at = None
+                    state.last_pending_at = None
+
+                    await run_turn(
+                        conversation_id,
+                        texts,
+                        runner=self.runner,
+                        app_name=self.app_name,
+                        stream=self.stream,
+                        fast_path=self.fast_path,
+                        response_cache=self.response_cache,
+                        tool_workers=self.tool_workers,
+                    )
+                    self.completed_turns += 1
+                except Exception as exc:
+                    self.failed_turns += 1
+                    print(f"[Scheduler] Turn failed for conversation {conversation_id}: {exc}")
+                finally:
+                    self.in_flight_turns -= 1
+                    self._slots.release()
+        finally:
+            # No await between the loop check above and this point, so a
+            # message cannot slip in unnoticed while the worker winds down.
+            state.is_processing = False
+            if self._workers.get(conversation_id) is asyncio.current_task():
+                del self._workers[conversation_id]
+
+    def metrics(self) -> dict:
+        return {
+            "max_concurrent_turns": self.max_concurrent_turns,
+            "active_conversations": len(self._workers),
+            "pending_messages": sum(
+                len(get_or_create_state(cid).pending_texts) for cid in self._workers
+            ),
+            "waiting_turns": self.waiting_turns,
+            "max_waiting_turns": self.max_waiting_turns,
+            "in_flight_turns": self.in_flight_turns,
+            "completed_turns": self.completed_turns,
+            "failed_turns": self.failed_turns,
+        }
+
+
 
+def _event_text(event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    text_parts = []
+    for part in event.content.parts:
+        if getattr(part, "text", None):
+            text_parts.append(part.text)
+    return " ".join(text_parts).strip()
+
+
+async def _run_streaming_turn(
+    conversation_id: str,
+    runner,
+    content: genai_types.Content,
+    run_config: RunConfig,
+) -> Tuple[List[str], Set[str]]:
+    """
+    Run one turn in SSE streaming mode, keeping a draft message up to date.
+
+    Returns the final reply texts and the names of the tools that were called.
+    """
+    draft: MessageRecord | None = None
+    draft_text = ""
+    saved_at = 0.0
+    replies: List[str] = []
+    tools_used: Set[str] = set()
+
+    async def upsert_draft(text: str, progress: str | None) -> None:
+        # Chunks only go to live subscribers; the draft is stored when it
+        # starts, when its progress changes and at most every
+        # DRAFT_SAVE_INTERVAL seconds, so pollers still see it grow.
+        nonlocal draft, saved_at
+        now = time.monotonic()
+        if draft is None:
+            draft = MessageRecord(
+                conversation_id,
+                ChatRole.ASSISTANT,
+                text,
+                is_draft=True,
+                progress=progress,
+            )
+            await append_message(draft)
+            saved_at = now
+            return
+        save = progress != draft.progress or now - saved_at >= DRAFT_SAVE_INTERVAL
+        draft.text = text
+        draft.progress = progress
+        if save:
+            await update_message(draft)
+            saved_at = now
+        else:
+            _publish_draft(draft)
+
+    async def finish_draft(text: str) -> None:
+        nonlocal draft
+        if draft is None:
+            await append_message(MessageRecord(conversation_id, ChatRole.ASSISTANT, text))
+            return
+        draft.text = text
+        draft.progress = None
+        draft.is_draft = False
+        await update_message(draft)
+        draft = None
+
+    events = runner.run_async(
+        user_id=conversation_id,
+        session_id=conversation_id,
+        new_message=content,
+        run_config=run_config,
+    )
+
+    try:
+        async for event in events:
+            if event.partial:
+                chunk = "".join(
+                    part.text
+                    for part in (event.content.parts if event.content else None) or []
+                    if getattr(part, "text", None)
+                )
+                if chunk:
+                    draft_text += chunk
+                    await upsert_draft(draft_text, None)
+                continue
+
+            calls = event.get_function_calls()
+            if calls:
+                # The text streamed so far only led up to a tool call; the
+                # reply proper starts again once the tools have answered.
+                draft_text = ""
+                tools_used.update(call.name for call in calls)
+                names = ", ".join(call.name for call in calls)
+                await upsert_draft("", f"Running {names}...")
+                continue
+
+            if event.is_final_response():
+                full_text = _event_text(event)
+                if not full_text:
+                    continue
+                await finish_draft(full_text)
+                replies.append(full_text)
+                draft_text = ""
+    finally:
+        if draft is not None:
+            # The turn ended without a final reply for the open draft.
+            await finish_draft(draft.text or "Sorry, I couldn't finish that request. Please try again.")
+    return replies, tools_used
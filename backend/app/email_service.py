@@ -1,10 +1,62 @@
+import asyncio
 import smtplib
+import time
+from dataclasses import dataclass, field
 from email.mime.text import MIMEText
-from typing import Optional
+from email.utils import make_msgid
+from typing import Dict, List, Optional
 
 from .config import get_settings
 
 
+def _smtp_configured(settings) -> bool:
+    return bool(settings.smtp_host and settings.smtp_port and settings.smtp_from_email)
+
+
+def _print_email(banner: str, to_email: str, subject: str, body: str) -> None:
+    # Fallback: console log for demo purposes.
+    print(f"--- ESCALATION EMAIL ({banner}) ---")
+    print(f"To: {to_email}")
+    print(f"Subject: {subject}")
+    print(body)
+    print("-" * (len(banner) + 24))
+
+
+def _build_message(settings, subject: str, body: str, to_email: str, message_id: Optional[str] = None) -> MIMEText:
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = settings.smtp_from_email
+    msg["To"] = to_email
+    msg["Message-ID"] = message_id or _new_message_id()
+    return msg
+
+
+def _new_message_id() -> str:
+    # Use the sender's domain; make_msgid() would otherwise do a DNS lookup.
+    sender = get_settings().smtp_from_email or ""
+    return make_msgid(domain=sender.rpartition("@")[2] or "localhost")
+
+
+def _open_smtp(settings) -> smtplib.SMTP:
+    server = smtplib.SMTP(settings.smtp_host, int(settings.smtp_port), timeout=settings.smtp_timeout_seconds)
+    if settings.smtp_username and settings.smtp_password:
+        server.starttls()
+        server.login(settings.smtp_username, settings.smtp_password)
+    return server
+
+
+def _is_transient(exc: Exception) -> bool:
+    """4xx replies and lost connections may succeed later; 5xx replies will not."""
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return any(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    # Every other SMTPException is an OSError too, but not a network failure.
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
 def send_escalation_email(
     subject: str,
     body: str,
@@ -16,48 +68,257 @@ def send_escalation_email(
     In development, if SMTP is not configured, this function will just
     print the email contents to stdout so the flow can be demonstrated
     without a real email provider.
+
+    This opens a connection per call and blocks; the agent tools go through
+    ``EMAIL_OUTBOX`` instead.
     """
-    print("SEND_ESCALATION_EMAIL FUNCTION CALLED")
     settings = get_settings()
-    print("SMTP HOST:", settings.smtp_host)
-    print("SMTP USER:", settings.smtp_username)
-    print("SUPERVISOR:", settings.supervisor_email)
     recipient = to_email or settings.supervisor_email
 
     if not recipient:
-        # Fallback: console log for demo purposes.
-        print("--- ESCALATION EMAIL (NO SMTP CONFIGURED) ---")
-        print(f"To: (missing supervisor_email) ")
-        print(f"Subject: {subject}")
-        print(body)
-        print("--------------------------------------------")
+        _print_email("NO SMTP CONFIGURED", "(missing supervisor_email)", subject, body)
         return
 
-    if not (
-        settings.smtp_host
-        and settings.smtp_port
-        and settings.smtp_from_email
-    ):
-        # Fallback: console log when SMTP is incomplete.
-        print("--- ESCALATION EMAIL (INCOMPLETE SMTP CONFIG) ---")
-        print(f"To: {recipient}")
-        print(f"Subject: {subject}")
-        print(body)
-        print("-------------------------------------------------")
+    if not _smtp_configured(settings):
+        _print_email("INCOMPLETE SMTP CONFIG", recipient, subject, body)
         return
 
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = settings.smtp_from_email
-    msg["To"] = recipient
-
     try:
-        with smtplib.SMTP(settings.smtp_host, int(settings.smtp_port)) as server:
-            if settings.smtp_username and settings.smtp_password:
-                server.starttls()
-                server.login(settings.smtp_username, settings.smtp_password)
-            server.send_message(msg)
+        with _open_smtp(settings) as server:
+            server.send_message(_build_message(settings, subject, body, recipient))
 
     except Exception as exc:  # pragma: no cover - best effort logging
         print(f"[EmailService] Failed to send escalation email: {exc}")
 
+
+@dataclass
+class OutgoingEmail:
+    subject: str
+    body: str
+    to_email: Optional[str]
+    message_id: str
+    attempts: int = 0
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class EmailOutbox:
+    """
+    Background sender for escalation emails.
+
+    ``enqueue`` returns at once; a single worker task drains the queue. Mails
+    that arrive together are sent as one batch over one authenticated SMTP
+    connection, which is kept open between batches and closed once it has
+    been idle for ``idle_timeout`` seconds. A failed mail is retried with
+    exponential backoff up to ``max_attempts`` times, but only if the failure
+    is transient (a 4xx reply or a lost connection); a mail the server
+    rejects with a 5xx reply is dropped at once. SMTP itself is
+    blocking, so each batch runs in a worker thread and never stalls the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 20,
+        batch_window: float = 0.2,
+        max_attempts: int = 5,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 60.0,
+        idle_timeout: float = 30.0,
+    ) -> None:
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.idle_timeout = idle_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Retry timers and the mail each one will requeue.
+        self._retries: Dict[asyncio.Task, OutgoingEmail] = {}
+        self._sending: List[OutgoingEmail] = []
+        self._stopping = False
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.connections = 0
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._worker = asyncio.create_task(self._run(), name="email-outbox")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Send what is queued (waiting up to ``timeout``), then shut down.
+
+        Mails waiting out a retry backoff get one last attempt right away;
+        whatever still cannot be sent is logged by subject.
+        """
+        if self._worker is None:
+            return
+        self._stopping = True
+        for task, email in self._retries.items():
+            task.cancel()
+            self._queue.put_nowait(email)
+        self._retries.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            unsent = self._queue.qsize() + len(self._sending)
+            print(f"[EmailOutbox] Stopping with {unsent} unsent email(s)")
+            for email in self._sending:
+                print(f"[EmailOutbox] Still sending at shutdown: '{email.subject}' ({email.message_id})")
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        while not self._queue.empty():
+            email = self._queue.get_nowait()
+            self._queue.task_done()
+            self.failed += 1
+            print(f"[EmailOutbox] Unsent at shutdown: '{email.subject}' ({email.message_id})")
+        self._worker = None
+        self._stopping = False
+        await asyncio.to_thread(self._disconnect)
+
+    def enqueue(self, subject: str, body: str, to_email: Optional[str] = None) -> str:
+        """Queue an email and return the Message-ID it will be sent with."""
+        self.start()
+        email = OutgoingEmail(subject=subject, body=body, to_email=to_email, message_id=_new_message_id())
+        self._queue.put_nowait(email)
+        self.enqueued += 1
+        return email.message_id
+
+    async def _run(self) -> None:
+        while True:
+            idle_left = None
+            if self._server is not None:
+                idle_left = max(0.0, self._last_used + self.idle_timeout - time.monotonic())
+            try:
+                batch: List[OutgoingEmail] = [await asyncio.wait_for(self._queue.get(), idle_left)]
+            except asyncio.TimeoutError:
+                # Nothing to send for a while: do not hold the SMTP session open.
+                await asyncio.to_thread(self._disconnect)
+                continue
+            # Let a burst build up so it goes out over one connection.
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._sending = batch
+            try:
+                failures = await asyncio.to_thread(self._send_batch, batch)
+                for email, exc in failures:
+                    self._schedule_retry(email, exc)
+            finally:
+                self._sending = []
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _schedule_retry(self, email: OutgoingEmail, exc: Exception) -> None:
+        if not _is_transient(exc):
+            self.failed += 1
+            print(f"[EmailOutbox] '{email.subject}' was rejected, not retrying: {exc}")
+            return
+        if email.attempts >= self.max_attempts or self._stopping:
+            self.failed += 1
+            print(f"[EmailOutbox] Giving up on '{email.subject}' after {email.attempts} attempts: {exc}")
+            return
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (email.attempts - 1))
+        print(f"[EmailOutbox] Send failed ({exc}); retrying in {delay:.1f}s")
+        self.retried += 1
+
+        async def requeue() -> None:
+            await asyncio.sleep(delay)
+            self._queue.put_nowait(email)
+
+        task = asyncio.create_task(requeue())
+        self._retries[task] = email
+        task.add_done_callback(lambda done: self._retries.pop(done, None))
+
+    def _connection(self, settings) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._disconnect()
+        if self._server is None:
+            self._server = _open_smtp(settings)
+            self._last_used = time.monotonic()
+            self.connections += 1
+        return self._server
+
+    def _disconnect(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def _send_batch(self, batch: List[OutgoingEmail]) -> List[tuple]:
+        """Send a batch from a worker thread; returns ``(email, error)`` pairs that failed."""
+        settings = get_settings()
+        self.batches += 1
+        failures = []
+        for email in batch:
+            recipient = email.to_email or settings.supervisor_email
+            if not recipient:
+                _print_email("NO SMTP CONFIGURED", "(missing supervisor_email)", email.subject, email.body)
+                continue
+            if not _smtp_configured(settings):
+                _print_email("INCOMPLETE SMTP CONFIG", recipient, email.subject, email.body)
+                continue
+
+            email.attempts += 1
+            message = _build_message(settings, email.subject, email.body, recipient, email.message_id)
+            try:
+                try:
+                    self._connection(settings).send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    # The kept-alive connection was dropped by the server; reconnect once.
+                    self._server = None
+                    self._connection(settings).send_message(message)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as exc:
+                # The server refused this mail but the session is still usable.
+                failures.append((email, exc))
+                continue
+            except Exception as exc:
+                self._disconnect()
+                failures.append((email, exc))
+                continue
+            self._last_used = time.monotonic()
+            self.sent += 1
+        return failures
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+            "connections": self.connections,
+        }
+
+
+EMAIL_OUTBOX = EmailOutbox()
+
+
+def configure_outbox(outbox: EmailOutbox) -> None:
+    global EMAIL_OUTBOX
+    EMAIL_OUTBOX = outbox
+
+
+def get_outbox() -> EmailOutbox:
+    return EMAIL_OUTBOX
+
+
+def enqueue_escalation_email(subject: str, body: str, to_email: Optional[str] = None) -> str:
+    """Queue an escalation email for background delivery; returns its Message-ID."""
+    return EMAIL_OUTBOX.enqueue(subject, body, to_email)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from .mock_db import list_activities, search_activities
+from .models import Activity
+from .search_index import tokenize
+
+
+# Words that mean the user wants something only the agents can do.
+AGENT_ONLY_TERMS = {
+    "book", "booking", "reserve", "reservation", "buy", "pay",
+    "manager", "supervisor", "human", "person", "someone",
+    "discount", "offer", "offers", "deal", "deals", "cheaper", "coupon",
+    "compare", "vs", "versus", "recommend", "best", "which",
+}
+
+INTENT_TERMS = {
+    "price": {"price", "prices", "pricing", "cost", "costs", "fee", "fees", "rate", "rates"},
+    "cancellation": {"cancel", "cancellation", "refund", "refunds", "refundable"},
+    "reschedule": {"reschedule", "rescheduling", "postpone", "rebook"},
+    "policy": {"policy", "policies"},
+    "images": {"image", "images", "photo", "photos", "picture", "pictures", "pics"},
+    "listing": {"activities", "list", "options", "things", "tours", "attractions"},
+}
+
+# Words that carry no information about which activity is meant.
+FILLER_TERMS = {
+    "a", "an", "the", "for", "of", "to", "in", "at", "on", "is", "are", "and", "or",
+    "what", "whats", "s", "how", "do", "does", "can", "could", "you", "me", "i", "my",
+    "please", "show", "tell", "give", "send", "see", "get", "some", "any", "all",
+    "about", "your", "there", "it", "its", "hi", "hello", "hey", "thanks", "thank",
+    "per", "ticket", "tickets", "entry", "have", "with", "much", "available", "dubai",
+    "want", "like", "would", "know", "info", "information",
+}
+
+# An entity match must score at least this and beat the runner-up by RATIO.
+MIN_ENTITY_SCORE = 2.5
+MIN_ENTITY_RATIO = 2.0
+MAX_QUERY_TOKENS = 20
+
+
+@dataclass
+class FastPathMetrics:
+    turns: int = 0
+    served: int = 0
+    by_intent: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, intents: Optional[List[str]]) -> None:
+        self.turns += 1
+        if intents:
+            self.served += 1
+            for intent in intents:
+                self.by_intent[intent] = self.by_intent.get(intent, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "turns": self.turns,
+            "served": self.served,
+            "served_share": self.served / self.turns if self.turns else 0.0,
+            "by_intent": dict(self.by_intent),
+        }
+
+
+FAST_PATH_METRICS = FastPathMetrics()
+
+
+@dataclass
+class FastPathReply:
+    intents: List[str]
+    text: str
+
+
+def detect_intents(tokens: Set[str]) -> List[str]:
+    intents = [intent for intent, terms in INTENT_TERMS.items() if tokens & terms]
+    if "price" not in intents and {"how", "much"} <= tokens:
+        intents.insert(0, "price")
+    return intents
+
+
+def subject_keywords(tokens: List[str]) -> List[str]:
+    """Query tokens that can name an activity (no filler, no intent words)."""
+    return [
+        t for t in tokens
+        if t not in FILLER_TERMS and not any(t in terms for terms in INTENT_TERMS.values())
+    ]
+
+
+def is_simple_question(text: str) -> bool:
+    """True for short questions with nothing only the agents can handle."""
+    tokens = tokenize(text)
+    if not tokens or len(tokens) > MAX_QUERY_TOKENS:
+        return False
+    return not (set(tokens) & AGENT_ONLY_TERMS or re.search(r"\d", text))
+
+
+def resolve_activity(tokens: List[str]) -> Optional[Activity]:
+    """Return the activity the query names, if exactly one stands out."""
+    keywords = subject_keywords(tokens)
+    if not keywords:
+        return None
+    hits = search_activities(" ".join(keywords), limit=2)
+    if not hits or hits[0][1] < MIN_ENTITY_SCORE:
+        return None
+    if len(hits) > 1 and hits[0][1] < MIN_ENTITY_RATIO * hits[1][1]:
+        return None
+    return hits[0][0]
+
+
+def _format_price(activity: Activity) -> str:
+    lines = [f"Here are the prices for {activity.name}:"]
+    for v in activity.variations:
+        line = (
+            f"- {v.name} ({v.time_slot}, {v.group_size_min}-{v.group_size_max} guests): "
+            f"{v.price_per_person:g} {v.currency} per person"
+        )
+        if not v.is_available:
+            line += " (currently unavailable)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _format_listing() -> str:
+    lines = ["Here are the activities we offer in Dubai:"]
+    for activity in list_activities():
+        prices = [v.price_per_person for v in activity.variations]
+        if prices:
+            currency = activity.variations[0].currency
+            lines.append(f"- {activity.name} (from {min(prices):g} {currency})")
+        else:
+            lines.append(f"- {activity.name}")
+    lines.append("")
+    lines.append("Ask me about prices, policies or photos for any of them, or tell me what you'd like to book.")
+    return "\n".join(lines)
+
+
+def try_fast_path(text: str) -> Optional[FastPathReply]:
+    """
+    Answer simple catalog questions from templates, without the agents.
+
+    Handles prices, cancellation/reschedule policies, photos and the activity
+    list. Anything that looks like a booking, an escalation, a comparison, or
+    mentions numbers (dates, group sizes), and any question whose activity is
+    not a clear single match, returns None so the agents handle it.
+    """
+    if not is_simple_question(text):
+        return None
+    tokens = tokenize(text)
+    intents = detect_intents(set(tokens))
+    if not intents:
+        return None
+
+    activity = resolve_activity(tokens)
+    if activity is None:
+        if intents == ["listing"]:
+            return FastPathReply(intents=intents, text=_format_listing())
+        return None
+
+    sections: List[str] = []
+    served: List[str] = []
+    image_urls: List[str] = []
+    for intent in intents:
+        if intent == "price":
+            sections.append(_format_price(activity))
+        elif intent == "cancellation":
+            sections.append(f"Cancellation policy for {activity.name}: {activity.cancellation_policy}")
+        elif intent == "reschedule":
+            sections.append(f"Reschedule policy for {activity.name}: {activity.reschedule_policy}")
+        elif intent == "policy" and not {"cancellation", "reschedule"} & set(intents):
+            sections.append(
+                f"Policies for {activity.name}:\n"
+                f"- Cancellation: {activity.cancellation_policy}\n"
+                f"- Reschedule: {activity.reschedule_policy}"
+            )
+        elif intent == "images":
+            sections.append(f"Here are some photos of {activity.name}:")
+            image_urls = [str(url) for url in activity.images]
+        else:
+            continue
+        served.append(intent)
+    if not sections:
+        return None
+
+    reply = "\n\n".join(sections)
+    if image_urls:
+        # Same convention as the agents: raw URLs, one per line, at the end.
+        reply += "\n\n" + "\n".join(image_urls)
+    return FastPathReply(intents=served, text=reply)
+
+
+def get_fast_path_metrics() -> dict:
+    return FAST_PATH_METRICS.as_dict()
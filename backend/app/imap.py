@@ -1,31 +1,32 @@
+import asyncio
 import os
 import re
+import json
 import time
+import base64
+import quopri
+import select
+import socket
+import ssl
 import imaplib
 import email
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
 from email.header import decode_header
 from urllib.parse import urljoin
-from config import get_settings
 import email.utils
 
 
 import requests
 
+from .config import Settings, get_settings
+from .models import SupervisorReply
+from .supervisor_replies import deliver_supervisor_replies
 
-settings = get_settings()
-IMAP_HOST = settings.supervisor_imap_host
-IMAP_PORT = settings.supervisor_imap_port
-IMAP_EMAIL = settings.supervisor_imap_email
-IMAP_APP_PASSWORD = settings.supervisor_imap_app_password
 
-BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL", "http://127.0.0.1:8000")
-API_PREFIX = os.getenv("API_PREFIX", "/api")  # keep default unless you changed it
-SUBJECT_TAG = os.getenv("ESCALATION_SUBJECT_TAG", "[Dubai Travel Assistant]")
-
-POLL_SECONDS = int(os.getenv("IMAP_POLL_SECONDS", "15"))
-
-# Extract conversation_id from subject like: conversation_id=demo-conversation
-CONV_RE = re.compile(r"conversation_id=([A-Za-z0-9_\-]+)")
+# Headers fetched up front for every new message; bodies only for replies we keep
+HEADER_FIELDS = ("FROM", "SUBJECT", "MESSAGE-ID", "IN-REPLY-TO", "REFERENCES")
 
 
 
@@ -81,92 +82,726 @@ def _strip_quoted_reply(text: str) -> str:
             cut = min(cut, idx)
     return text[:cut].strip()
 
-def inject_supervisor_message(conversation_id: str, message: str) -> None:
-    endpoint = f"{API_PREFIX}/escalations/{conversation_id}/supervisor-reply"
-    url = urljoin(BACKEND_BASE_URL, endpoint)
-    r = requests.post(url, json={"message": message}, timeout=15)
-    r.raise_for_status()
-
-def main():
-    if not IMAP_EMAIL or not IMAP_APP_PASSWORD:
-        raise SystemExit("Missing SUPERVISOR_IMAP_EMAIL or SUPERVISOR_IMAP_APP_PASSWORD env vars.")
-
-    print(f"[IMAP] Connecting to {IMAP_HOST}:{IMAP_PORT} as {IMAP_EMAIL}")
-    while True:
-        try:
-            print("Step 1: Creating IMAP4_SSL")
-            mail = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT)
-
-            print("Step 2: Logging in")
-            mail.login(IMAP_EMAIL, IMAP_APP_PASSWORD)
+# Takes a batch of reply payloads (see models.SupervisorReply) and returns
+# one result per reply (see models.SupervisorReplyResult).
+ReplySink = Callable[[List[dict]], List[dict]]
 
-            print("Step 3: Selecting INBOX")
-            mail.select("INBOX")
 
-            print("Step 4: Searching UNSEEN")
-            status, data = mail.search(None, "UNSEEN")
-
-            print("Step 5: Search complete")
-            print(f"[IMAP] Search status: {status}, found {len(data[0].split())} messages")
-            if status != "OK":
-                mail.logout()
-                time.sleep(POLL_SECONDS)
-                continue
-
-            ids = data[0].split()
-            for msg_id in ids:
-                status, msg_data = mail.fetch(msg_id, "(RFC822)")
-                if status != "OK":
-                    continue
+class HttpReplyDelivery:
+    """
+    Posts supervisor replies to the API in batches.
 
-                raw = msg_data[0][1]
-                msg = email.message_from_bytes(raw)
+    One ``requests.Session`` is kept for the poller's lifetime, so batches
+    reuse a keep-alive connection instead of opening one per reply.
+    Routing to the right chat happens on the API side.
+    """
 
-                subject = _decode_mime_words(msg.get("Subject", "") or "")
-                from_ = _decode_mime_words(msg.get("From", "") or "")
-                # print("DEBUG SUBJECT:", subject)
-                print("DEBUG FROM:", from_)
+    def __init__(
+        self,
+        base_url: str,
+        api_prefix: str = "/api",
+        timeout: float = 15,
+        token: Optional[str] = None,
+    ) -> None:
+        self.url = urljoin(base_url, f"{api_prefix}/escalations/supervisor-replies")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            # Lets the API apply APPROVE/REJECT replies to bookings.
+            self.session.headers["X-Supervisor-Token"] = token
+
+    def __call__(self, replies: List[dict]) -> List[dict]:
+        r = self.session.post(self.url, json=replies, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+@dataclass
+class MailboxState:
+    """Where the poller left off, so a restart resumes instead of rescanning."""
+
+    uidvalidity: Optional[int] = None
+    last_uid: int = 0
+
+    @classmethod
+    def load(cls, path: str) -> "MailboxState":
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        return cls(uidvalidity=data.get("uidvalidity"), last_uid=int(data.get("last_uid", 0)))
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"uidvalidity": self.uidvalidity, "last_uid": self.last_uid}, f)
+        os.replace(tmp, path)
+
+
+@dataclass
+class LatencyMetrics:
+    """Time from a reply reaching the mailbox to it being delivered to the chat."""
+
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "replies": self.count,
+            "avg_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "max_seconds": self.max_seconds,
+            "last_seconds": self.last_seconds,
+        }
+
+
+def _internaldate_of(header: bytes) -> Optional[float]:
+    parsed = imaplib.Internaldate2tuple(header)
+    return time.mktime(parsed) if parsed else None
+
+
+def _uid_set(uids) -> str:
+    """Compact IMAP UID set, e.g. [1, 2, 3, 7] -> "1:3,7"."""
+    ranges: List[List[int]] = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(lo) if lo == hi else f"{lo}:{hi}" for lo, hi in ranges)
+
+
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|"((?:[^"\\]|\\.)*)"|\{(\d+)\}(?:\r\n)?|([^\s()"]+))')
+_CLOSE_RE = re.compile(rb"\s*\)")
+_SECTION_LITERAL_RE = re.compile(rb"BODY\[[^\]]*\](?:<\d+>)? \{\d+\}$")
+_RECORD_START_RE = re.compile(rb"\d+ \(")
+
+
+def _parse_sexp(data: bytes, pos: int = 0):
+    """Parse one IMAP value (list, string, literal or atom) at ``pos``; returns (value, end)."""
+    m = _TOKEN_RE.match(data, pos)
+    if not m:
+        raise ValueError(f"Unparseable IMAP data at {pos}")
+    pos = m.end()
+    if m.group(1):
+        items = []
+        while True:
+            close = _CLOSE_RE.match(data, pos)
+            if close:
+                return items, close.end()
+            item, pos = _parse_sexp(data, pos)
+            items.append(item)
+    if m.group(2) is not None:
+        return re.sub(rb"\\(.)", rb"\1", m.group(2)).decode(errors="ignore"), pos
+    if m.group(3) is not None:
+        size = int(m.group(3))
+        return data[pos:pos + size].decode(errors="ignore"), pos + size
+    atom = m.group(4).decode(errors="ignore")
+    return (None if atom.upper() == "NIL" else atom), pos
+
+
+@dataclass
+class TextPart:
+    """Where a message's readable text lives, from its BODYSTRUCTURE."""
+
+    section: str
+    subtype: str
+    encoding: str
+    charset: str
+
+
+def _text_parts(structure: list, prefix: str = ""):
+    """Yield the non-attachment text/* parts of a parsed BODYSTRUCTURE."""
+    if structure and isinstance(structure[0], list):
+        # Multipart: child bodies come first, then the subtype and extensions.
+        children = []
+        for item in structure:
+            if not isinstance(item, list):
+                break
+            children.append(item)
+        for i, child in enumerate(children, 1):
+            yield from _text_parts(child, f"{prefix}.{i}" if prefix else str(i))
+        return
+    if len(structure) < 8 or str(structure[0]).lower() != "text":
+        return
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == "attachment":
+        return
+    params = structure[2] if isinstance(structure[2], list) else []
+    params = {str(k).lower(): v for k, v in zip(params[::2], params[1::2])}
+    yield TextPart(
+        section=prefix or "1",
+        subtype=str(structure[1]).lower(),
+        encoding=str(structure[5] or "7bit").lower(),
+        charset=params.get("charset") or "utf-8",
+    )
+
+
+def _pick_text_part(structure: list) -> Optional[TextPart]:
+    # Prefer text/plain, like _get_plain_text_body.
+    parts = list(_text_parts(structure))
+    for part in parts:
+        if part.subtype == "plain":
+            return part
+    return parts[0] if parts else None
+
+
+def _decode_part(data: bytes, part: TextPart) -> str:
+    try:
+        if part.encoding == "base64":
+            data = base64.b64decode(data)
+        elif part.encoding == "quoted-printable":
+            data = quopri.decodestring(data)
+    except ValueError:
+        pass
+    try:
+        return data.decode(part.charset, errors="ignore").strip()
+    except LookupError:
+        return data.decode("utf-8", errors="ignore").strip()
+
+
+def _fetch_records(data: list) -> Dict[int, Tuple[bytes, Optional[bytes]]]:
+    """
+    Group an imaplib FETCH response by UID into ``(metadata, section)`` pairs.
 
-                # Only process supervisor replies to our escalations
+    imaplib splits every response at its literals: the requested BODY[...]
+    section arrives as a ``(prefix, literal)`` tuple and the rest of the
+    line as plain bytes. The section literal is swapped for NIL in the
+    metadata so BODYSTRUCTURE can still be parsed out of it.
+    """
+    records: Dict[int, Tuple[bytes, Optional[bytes]]] = {}
+    meta, section = b"", None
+
+    def flush() -> None:
+        m = re.search(rb"UID (\d+)", meta)
+        if m:
+            records[int(m.group(1))] = (meta, section)
+
+    for item in data:
+        head = item[0] if isinstance(item, tuple) else item
+        if not head:
+            continue
+        if meta and _RECORD_START_RE.match(head):
+            flush()
+            meta, section = b"", None
+        if not isinstance(item, tuple):
+            meta += item
+        elif _SECTION_LITERAL_RE.search(head):
+            meta += head[:head.rfind(b"{")] + b"NIL"
+            section = item[1]
+        else:
+            meta += head + item[1]
+    if meta:
+        flush()
+    return records
+
+
+@dataclass
+class MailSummary:
+    """Headers and structure of a new message, fetched before any body."""
+
+    uid: int
+    headers: email.message.Message
+    received_at: Optional[float]
+    text_part: Optional[TextPart]
+
+    @classmethod
+    def from_record(cls, uid: int, meta: bytes, header_bytes: Optional[bytes]) -> "MailSummary":
+        text_part = None
+        start = meta.find(b"BODYSTRUCTURE ")
+        if start != -1:
+            try:
+                structure, _ = _parse_sexp(meta, start + len(b"BODYSTRUCTURE "))
+                text_part = _pick_text_part(structure)
+            except (ValueError, IndexError):
+                text_part = None
+        return cls(
+            uid=uid,
+            headers=email.message_from_bytes(header_bytes or b""),
+            received_at=_internaldate_of(meta),
+            text_part=text_part,
+        )
+
+
+class SupervisorInbox:
+    """
+    Long-lived IMAP session that watches INBOX for supervisor replies.
 
-                # Extract clean sender email
-                raw_from = msg.get("From", "")
-                sender_email = email.utils.parseaddr(raw_from)[1].lower()
-                print("DEBUG SENDER_EMAIL:", sender_email)
-                print("supervisor_email:", settings.supervisor_email)
+    One connection is opened and kept. New mail is found by UID: everything
+    above the last processed UID (persisted together with the mailbox's
+    UIDVALIDITY) that is still UNSEEN. Between checks the connection sits in
+    IMAP IDLE, so the server pushes new mail immediately; servers without
+    IDLE are polled every ``poll_seconds`` over the same connection.
 
-                if sender_email != settings.supervisor_email.lower():
-                    print(f"[IMAP] Skipping non-supervisor email from {sender_email}")
-                    mail.store(msg_id, "+FLAGS", "\\Seen")
-                    continue
+    Replies found in one pass are handed to ``deliver`` as one batch: over
+    HTTP (``HttpReplyDelivery``) when run as a script, or straight to
+    ``supervisor_replies`` when run inside the API process.
 
-                # For demo, inject into known conversation
-                conversation_id = "demo-conversation"
-                
-                body = _get_plain_text_body(msg)
-                clean = _strip_quoted_reply(body)
+    The methods block; ``interrupt`` may be called from another thread to
+    end an IDLE or poll wait early and stop ``run_forever``.
+    """
 
-                if not clean:
-                    print(f"[IMAP] Empty body, skipping: subject={subject}")
-                    mail.store(msg_id, "+FLAGS", "\\Seen")
-                    continue
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        supervisor_email: str,
+        deliver: ReplySink,
+        subject_tag: str = "[Dubai Travel Assistant]",
+        state_path: str = "imap_state.json",
+        use_ssl: bool = True,
+        poll_seconds: float = 15.0,
+        idle_seconds: float = 300.0,
+        max_backoff_seconds: float = 300.0,
+        timeout_seconds: float = 30.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.supervisor_email = supervisor_email.lower()
+        self.deliver = deliver
+        self.subject_tag = subject_tag
+        self.state_path = state_path
+        self.use_ssl = use_ssl
+        self.poll_seconds = poll_seconds
+        self.idle_seconds = idle_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.state = MailboxState.load(state_path)
+        self.latency = LatencyMetrics()
+        self.mail: Optional[imaplib.IMAP4] = None
+        self.supports_idle = False
+        self.last_check_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reconnects = 0
+        self._stopping = threading.Event()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+
+    @classmethod
+    def from_settings(cls, settings: Settings, deliver: ReplySink) -> "SupervisorInbox":
+        return cls(
+            host=settings.supervisor_imap_host or "imap.gmail.com",
+            port=settings.supervisor_imap_port or 993,
+            username=settings.supervisor_imap_email,
+            password=settings.supervisor_imap_app_password,
+            supervisor_email=settings.supervisor_email or "",
+            deliver=deliver,
+            subject_tag=settings.escalation_subject_tag,
+            state_path=settings.imap_state_path,
+            use_ssl=settings.imap_ssl,
+            poll_seconds=settings.imap_poll_seconds,
+            idle_seconds=settings.imap_idle_seconds,
+            max_backoff_seconds=settings.imap_max_backoff_seconds,
+        )
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def interrupt(self) -> None:
+        """Ask the inbox to stop; safe to call from any thread."""
+        self._stopping.set()
+        try:
+            self._wakeup_w.send(b"x")
+        except OSError:
+            pass
+
+    def connect(self) -> None:
+        print(f"[IMAP] Connecting to {self.host}:{self.port} as {self.username}")
+        imap_class = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+        self.mail = imap_class(self.host, self.port, timeout=self.timeout_seconds)
+        self.mail.login(self.username, self.password)
+        self.mail.select("INBOX")
+        _, data = self.mail.response("UIDVALIDITY")
+        uidvalidity = int(data[0]) if data and data[0] else None
+        if uidvalidity != self.state.uidvalidity:
+            # UIDs from another mailbox generation mean nothing here; fall
+            # back to the UNSEEN flag alone for this first pass.
+            if self.state.uidvalidity is not None:
+                print(f"[IMAP] UIDVALIDITY changed ({self.state.uidvalidity} -> {uidvalidity}); resetting")
+            self.state = MailboxState(uidvalidity=uidvalidity, last_uid=0)
+            self.state.save(self.state_path)
+        self.supports_idle = "IDLE" in self.mail.capabilities
+        self.last_error = None
+
+    def close(self) -> None:
+        if self.mail is None:
+            return
+        try:
+            self.mail.logout()
+        except Exception:
+            pass
+        self.mail = None
+
+    def new_uids(self) -> List[int]:
+        status, data = self.mail.uid("SEARCH", f"UID {self.state.last_uid + 1}:*", "UNSEEN")
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"UID SEARCH failed: {data}")
+        # "n:*" always matches the newest message, even below n.
+        return sorted(uid for uid in map(int, data[0].split()) if uid > self.state.last_uid)
+
+    def fetch_summaries(self, uids: List[int]) -> Dict[int, MailSummary]:
+        """Fetch headers, INTERNALDATE and BODYSTRUCTURE for all ``uids`` in one command."""
+        items = f"(UID INTERNALDATE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({' '.join(HEADER_FIELDS)})])"
+        status, data = self.mail.uid("FETCH", _uid_set(uids), items)
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"UID FETCH failed: {data}")
+        return {
+            uid: MailSummary.from_record(uid, meta, header_bytes)
+            for uid, (meta, header_bytes) in _fetch_records(data).items()
+        }
+
+    def fetch_bodies(self, summaries: List[MailSummary]) -> Dict[int, str]:
+        """
+        Fetch just the readable text of ``summaries``, keyed by UID.
+
+        Messages are fetched together in one command per distinct part number
+        (almost always one: "1" for plain mails, "1.1" for HTML alternatives).
+        Mails whose structure could not be read fall back to the full message.
+        """
+        by_section: Dict[str, List[MailSummary]] = {}
+        for summary in summaries:
+            section = summary.text_part.section if summary.text_part else ""
+            by_section.setdefault(section, []).append(summary)
+
+        bodies: Dict[int, str] = {}
+        for section, group in by_section.items():
+            status, data = self.mail.uid("FETCH", _uid_set(s.uid for s in group), f"(UID BODY.PEEK[{section}])")
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"UID FETCH failed: {data}")
+            records = _fetch_records(data)
+            for summary in group:
+                raw = (records.get(summary.uid) or (b"", None))[1] or b""
+                if summary.text_part:
+                    bodies[summary.uid] = _decode_part(raw, summary.text_part)
+                else:
+                    bodies[summary.uid] = _get_plain_text_body(email.message_from_bytes(raw))
+        return bodies
+
+    def mark_seen(self, uids: List[int]) -> None:
+        if uids:
+            self.mail.uid("STORE", _uid_set(uids), "+FLAGS.SILENT", "(\\Seen)")
+
+    def process_new_mail(self) -> int:
+        """
+        Handle every new message; returns how many were seen.
+
+        Headers for all new mail come in one FETCH, bodies only for the
+        supervisor replies among them, the replies are delivered as one
+        batch, and everything is flagged \\Seen in one STORE.
+        """
+        # Changes reported before this search are covered by it.
+        self._take_mailbox_changes()
+        uids = self.new_uids()
+        if not uids:
+            self.last_check_at = time.time()
+            return 0
+        print(f"[IMAP] {len(uids)} new message(s)")
+        summaries = self.fetch_summaries(uids)
+        replies = [summaries[uid] for uid in uids if uid in summaries and self._is_supervisor_reply(summaries[uid])]
+        bodies = self.fetch_bodies(replies) if replies else {}
+
+        batch = []
+        for summary in replies:
+            payload = self._build_reply(summary, bodies.get(summary.uid, ""))
+            if payload:
+                batch.append((summary, payload))
+        if batch:
+            results = self.deliver([payload for _, payload in batch])
+            self._record_results(batch, results)
+
+        # Flagged only after delivery, so a failed batch is retried next pass.
+        self.mark_seen(uids)
+        self.state.last_uid = uids[-1]
+        self.state.save(self.state_path)
+        self.last_check_at = time.time()
+        return len(uids)
+
+    def _is_supervisor_reply(self, summary: MailSummary) -> bool:
+        # Only process supervisor replies to our escalations
+        sender_email = email.utils.parseaddr(summary.headers.get("From", ""))[1].lower()
+        if sender_email != self.supervisor_email:
+            print(f"[IMAP] Skipping non-supervisor email from {sender_email}")
+            return False
+        subject = _decode_mime_words(summary.headers.get("Subject", "") or "")
+        if self.subject_tag not in subject:
+            print(f"[IMAP] Skipping supervisor email without {self.subject_tag}: subject={subject}")
+            return False
+        return True
+
+    def _build_reply(self, summary: MailSummary, body: str) -> Optional[dict]:
+        subject = _decode_mime_words(summary.headers.get("Subject", "") or "")
+        from_ = _decode_mime_words(summary.headers.get("From", "") or "")
+
+        clean = _strip_quoted_reply(body)
+        if not clean:
+            print(f"[IMAP] Empty body, skipping: subject={subject}")
+            return None
+
+        print(f"[IMAP] New supervisor reply from={from_} subject={subject}")
+        return {
+            "message": clean,
+            "subject": subject,
+            "in_reply_to": summary.headers.get("In-Reply-To"),
+            "references": summary.headers.get("References"),
+        }
+
+    def _record_results(self, batch: List[Tuple[MailSummary, dict]], results: List[dict]) -> None:
+        now = time.time()
+        for (summary, payload), result in zip(batch, results):
+            if result.get("status") != "delivered":
+                print(f"[IMAP] Reply not delivered ({result.get('status')}): subject={payload['subject']}")
+                continue
+            message = payload["message"]
+            print(
+                f"[IMAP] Injected into conv={result.get('conversation_id')}: "
+                f"{message[:200]}{'...' if len(message) > 200 else ''}"
+            )
+            if summary.received_at is not None:
+                self.latency.record(max(0.0, now - summary.received_at))
+
+    def _take_mailbox_changes(self) -> bool:
+        """Pop EXISTS/RECENT that imaplib collected from earlier responses."""
+        changed = False
+        for key in ("EXISTS", "RECENT"):
+            changed = self.mail.untagged_responses.pop(key, None) is not None or changed
+        return changed
+
+    def _has_buffered_input(self) -> bool:
+        """
+        True when bytes are already read but not yet consumed by readline().
+
+        imaplib reads through a buffered file, and TLS keeps decrypted bytes
+        of its own; select() on the socket sees neither, so an EXISTS that
+        arrived in the same packet as the IDLE continuation would otherwise
+        wait out the whole timeout.
+        """
+        sock = self.mail.sock
+        if getattr(sock, "pending", lambda: 0)():
+            return True
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            return bool(self.mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def idle(self, timeout: float) -> bool:
+        """
+        Wait in IMAP IDLE until the server reports new mail or ``timeout`` passes.
+
+        Returns True when the mailbox changed. imaplib only gained IDLE in
+        Python 3.14, so the command is driven by hand here.
+        """
+        # EXISTS answered to an earlier command would not be repeated in IDLE.
+        if self._take_mailbox_changes():
+            return True
+        tag = self.mail._new_tag()
+        self.mail.send(tag + b" IDLE\r\n")
+        line = self.mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE refused: {line!r}")
+
+        changed = False
+        deadline = time.monotonic() + timeout
+        sock = self.mail.sock
+        while not changed and not self.stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self._has_buffered_input():
+                readable, _, _ = select.select([sock, self._wakeup_r], [], [], remaining)
+                if self._wakeup_r in readable:
+                    self._wakeup_r.recv(64)
+                    break
+                if not readable:
+                    break
+            line = self.mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            if line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort(line.decode(errors="ignore").strip())
+            changed = b"EXISTS" in line or b"RECENT" in line
+
+        self.mail.send(b"DONE\r\n")
+        while True:
+            line = self.mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed ending IDLE")
+            if line.startswith(tag):
+                if b" OK" not in line:
+                    raise imaplib.IMAP4.error(f"IDLE failed: {line!r}")
+                return changed
+
+    def wait_for_mail(self) -> None:
+        if self.supports_idle:
+            self.idle(self.idle_seconds)
+        elif not self.pause(self.poll_seconds):
+            # Keeps the session alive and lets the server report new mail.
+            self.mail.noop()
+
+    def pause(self, seconds: float) -> bool:
+        """Sleep unless interrupted; returns True if the inbox is stopping."""
+        return self._stopping.wait(seconds)
+
+    def connection_failed(self, exc: Exception, backoff: float) -> None:
+        self.last_error = str(exc)
+        self.reconnects += 1
+        print(f"[IMAP] Error: {exc}; reconnecting in {backoff:.0f}s")
+        self.close()
+
+    def health(self) -> dict:
+        """
+        Connection state and lag, the seconds since the mailbox was last checked.
+
+        While idling the server pushes new mail at once, so lag only grows
+        past one IDLE (or poll) cycle when checks are failing.
+        """
+        lag = time.time() - self.last_check_at if self.last_check_at else None
+        cycle = self.idle_seconds if self.supports_idle else self.poll_seconds
+        healthy = self.mail is not None and lag is not None and lag <= 2 * cycle + 30
+        return {
+            "status": "ok" if healthy else "degraded",
+            "connected": self.mail is not None,
+            "mode": "idle" if self.supports_idle else "poll",
+            "lag_seconds": round(lag, 3) if lag is not None else None,
+            "last_error": self.last_error,
+            "reconnects": self.reconnects,
+            "reply_latency": self.latency.as_dict(),
+        }
+
+    def run_forever(self) -> None:
+        backoff = 1.0
+        while not self.stopping:
+            try:
+                self.connect()
+                backoff = 1.0
+                while not self.stopping:
+                    self.process_new_mail()
+                    self.wait_for_mail()
+            except Exception as e:
+                self.connection_failed(e, backoff)
+                self.pause(backoff)
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+        self.close()
+
+
+class SupervisorInboxService:
+    """
+    Runs the supervisor inbox as an asyncio task inside the API process.
 
-                print(f"[IMAP] New supervisor reply from={from_} conv={conversation_id} subject={subject}")
-                print(f"[IMAP] Injecting message: {clean[:200]}{'...' if len(clean) > 200 else ''}")
+    imaplib only offers blocking calls, so each step (connect, check, IDLE)
+    runs in a worker thread via ``asyncio.to_thread`` and the event loop
+    never waits on the mail server. Replies are delivered on the event loop,
+    where chat state and stream subscribers live, without an HTTP hop.
+    """
 
-                inject_supervisor_message(conversation_id, clean)
+    def __init__(self, settings: Settings) -> None:
+        self.inbox = SupervisorInbox.from_settings(settings, deliver=self._deliver_from_thread)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        # The blocking call currently running in a worker thread, if any.
+        self._step: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run(), name="supervisor-inbox")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Interrupt IDLE, let the current step finish and log out."""
+        if self._task is None:
+            return
+        self.inbox.interrupt()
+        try:
+            # Shielded: on timeout the task keeps going and logs out once the
+            # current step returns, instead of being cancelled under it.
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            print("[IMAP] Inbox did not stop in time; it will log out when the current step returns")
+        self._task = None
+
+    async def _run_step(self, func: Callable, *args):
+        # A cancelled to_thread() call keeps running in its thread, still using
+        # the connection; shielding keeps hold of it so _run can wait for it.
+        self._step = asyncio.create_task(asyncio.to_thread(func, *args))
+        return await asyncio.shield(self._step)
+
+    async def _run(self) -> None:
+        inbox = self.inbox
+        backoff = 1.0
+        try:
+            while not inbox.stopping:
+                try:
+                    await self._run_step(inbox.connect)
+                    backoff = 1.0
+                    while not inbox.stopping:
+                        await self._run_step(inbox.process_new_mail)
+                        await self._run_step(inbox.wait_for_mail)
+                except Exception as exc:
+                    await self._run_step(inbox.connection_failed, exc, backoff)
+                    await self._run_step(inbox.pause, backoff)
+                    backoff = min(backoff * 2, inbox.max_backoff_seconds)
+        finally:
+            # Never LOGOUT while another thread is still inside imaplib.
+            inbox.interrupt()
+            if self._step is not None:
+                await asyncio.gather(self._step, return_exceptions=True)
+            await asyncio.to_thread(inbox.close)
+
+    def _deliver_from_thread(self, replies: List[dict]) -> List[dict]:
+        # Called from the IMAP worker thread; hand the batch to the loop and wait.
+        future = asyncio.run_coroutine_threadsafe(self._deliver(replies), self._loop)
+        return future.result()
+
+    @staticmethod
+    async def _deliver(replies: List[dict]) -> List[dict]:
+        # Read from the supervisor's own mailbox, so replies may resolve bookings.
+        results = await deliver_supervisor_replies([SupervisorReply(**reply) for reply in replies], resolve=True)
+        return [result.model_dump() for result in results]
+
+    def health(self) -> dict:
+        return self.inbox.health()
+
+
+def build_inbox_service(settings: Settings) -> Optional[SupervisorInboxService]:
+    """Return the in-process inbox service, or None when it is not enabled."""
+    if not settings.supervisor_imap_enabled:
+        return None
+    if not settings.supervisor_imap_email or not settings.supervisor_imap_app_password:
+        print("[IMAP] SUPERVISOR_IMAP_ENABLED is set but IMAP credentials are missing; not starting")
+        return None
+    return SupervisorInboxService(settings)
 
-                # Mark as seen so it won't be processed again
-                mail.store(msg_id, "+FLAGS", "\\Seen")
 
-            mail.logout()
-        except Exception as e:
-            print(f"[IMAP] Error: {e}")
+def main():
+    """Run the poller as its own process, delivering replies to the API over HTTP."""
+    settings = get_settings()
+    if not settings.supervisor_imap_email or not settings.supervisor_imap_app_password:
+        raise SystemExit("Missing SUPERVISOR_IMAP_EMAIL or SUPERVISOR_IMAP_APP_PASSWORD env vars.")
 
-        time.sleep(POLL_SECONDS)
+    deliver = HttpReplyDelivery(
+        settings.backend_base_url,
+        settings.api_prefix,
+        token=settings.supervisor_reply_token,
+    )
+    inbox = SupervisorInbox.from_settings(settings, deliver)
+    inbox.run_forever()
 
 if __name__ == "__main__":
     main()
 
-#Terminal 2 (poller):
-# python -m app.imap_poller
\ No newline at end of file
+# Standalone (instead of SUPERVISOR_IMAP_ENABLED in the API process):
+# python -m app.imap
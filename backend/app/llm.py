@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import importlib.util
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, Optional
+
+import httpx
+from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import PrivateAttr
+
+from .config import Settings
+
+
+# Agent roles that can get their own model and limits.
+LLM_ROLES = ("router", "information", "booking")
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """Model and failure handling for one agent role."""
+
+    model: str
+    timeout_seconds: float = 30.0
+    num_retries: int = 2
+    breaker_failures: int = 5
+    breaker_cooldown_seconds: float = 30.0
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider that keeps failing."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a model after ``failure_threshold`` consecutive failures.
+
+    While open, calls fail immediately. After ``cooldown_seconds`` a single
+    trial call is let through; its success closes the breaker again, its
+    failure re-opens it for another cooldown.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown_seconds: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_flight):
+            self.rejected += 1
+            raise CircuitOpenError(f"LLM circuit for {self.name} is open; try again shortly.")
+        self.trial_in_flight = state == "half_open"
+        self.calls += 1
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def release_trial(self) -> None:
+        self.trial_in_flight = False
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+        }
+
+
+class ResilientLiteLlm(LiteLlm):
+    """LiteLlm with a per-request timeout, retries and a circuit breaker."""
+
+    _breaker: CircuitBreaker = PrivateAttr()
+
+    def __init__(self, model: str, breaker: CircuitBreaker, **kwargs: Any) -> None:
+        super().__init__(model=model, **kwargs)
+        self._breaker = breaker
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self._breaker.before_call()
+        try:
+            async for response in super().generate_content_async(llm_request, stream=stream):
+                yield response
+        except Exception:
+            self._breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or closed early by the caller: not the provider's fault.
+            self._breaker.release_trial()
+            raise
+        self._breaker.record_success()
+
+
+LLM_BREAKERS: Dict[str, CircuitBreaker] = {}
+_MODELS: Dict[str, ResilientLiteLlm] = {}
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def model_profile(settings: Settings, role: str) -> ModelProfile:
+    """Resolve a role's profile: defaults, then its model setting, then overrides."""
+    values: Dict[str, Any] = {
+        "model": getattr(settings, f"{role}_model") or settings.adk_model,
+        "timeout_seconds": settings.llm_timeout_seconds,
+        "num_retries": settings.llm_num_retries,
+        "breaker_failures": settings.llm_breaker_failures,
+        "breaker_cooldown_seconds": settings.llm_breaker_cooldown_seconds,
+    }
+    values.update(settings.llm_role_overrides.get(role, {}))
+    return ModelProfile(**values)
+
+
+def configure_http_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Install one pooled HTTP client for all provider calls made through litellm.
+
+    Without it every provider client builds its own connection pool; with it
+    keep-alive connections (and HTTP/2 streams, when enabled) are shared by
+    all agents.
+    """
+    global _HTTP_CLIENT
+    import litellm
+
+    if _HTTP_CLIENT is None:
+        http2 = settings.llm_http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("[LLM] LLM_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1")
+            http2 = False
+        _HTTP_CLIENT = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(settings.llm_timeout_seconds, connect=settings.llm_connect_timeout_seconds),
+        )
+        litellm.aclient_session = _HTTP_CLIENT
+    return _HTTP_CLIENT
+
+
+async def close_http_client() -> None:
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        import litellm
+
+        if litellm.aclient_session is _HTTP_CLIENT:
+            litellm.aclient_session = None
+        await _HTTP_CLIENT.aclose()
+        _HTTP_CLIENT = None
+
+
+def get_model(settings: Settings, role: str) -> ResilientLiteLlm:
+    """Return the shared model instance for an agent role."""
+    if role not in LLM_ROLES:
+        raise ValueError(f"Unknown LLM role {role!r}; expected one of {LLM_ROLES}")
+    model = _MODELS.get(role)
+    if model is None:
+        profile = model_profile(settings, role)
+        breaker = LLM_BREAKERS[role] = CircuitBreaker(
+            role,
+            failure_threshold=profile.breaker_failures,
+            cooldown_seconds=profile.breaker_cooldown_seconds,
+        )
+        model = _MODELS[role] = ResilientLiteLlm(
+            model=profile.model,
+            breaker=breaker,
+            timeout=profile.timeout_seconds,
+            num_retries=profile.num_retries,
+        )
+    return model
+
+
+def get_llm_metrics() -> dict:
+    return {
+        role: {"model": _MODELS[role].model, **breaker.as_dict()}
+        for role, breaker in LLM_BREAKERS.items()
+    }
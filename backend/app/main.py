@@ -1,29 +1,116 @@
 from __future__ import annotations
+import asyncio
+import hmac
 import os
-from datetime import datetime
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
-from fastapi import BackgroundTasks, Depends, FastAPI
+from fastapi import Depends, FastAPI, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
 from .agents import build_agents
 from .config import get_settings
 from .conversation_manager import (
+    CachePolicy,
+    CoalescePolicy,
+    TurnScheduler,
     append_message,
-    get_conversation_messages,
-    get_or_create_state,
-    process_pending_messages,
+    configure_cache,
+    get_coalescing_metrics,
+    get_last_rev,
+    get_memory_metrics,
+    get_messages_since,
+    subscribe,
+    unsubscribe,
 )
-from .mock_db import list_activities
-from .models import ChatMessage, ChatMessageCreate, ChatMessageResponse, ChatRole
+from .email_service import EmailOutbox, configure_outbox, get_outbox
+from .fast_path import get_fast_path_metrics
+from .imap import build_inbox_service
+from .llm import close_http_client, get_llm_metrics
+from .mock_db import count_escalations, list_activities, list_escalations
+from .models import (
+    ChatMessage,
+    ChatMessageCreate,
+    ChatMessageResponse,
+    ChatRole,
+    EscalationPage,
+    EscalationStatus,
+    MessageRecord,
+    SupervisorReply,
+    SupervisorReplyResult,
+)
+from .response_cache import ResponseCachePolicy, SemanticResponseCache
+from .sessions import session_size
+from .storage import get_store
+from .supervisor_replies import deliver_supervisor_replies, get_escalation_metrics
+from .tool_cache import TOOL_CACHE
 
 
 settings = get_settings()
 os.environ["OPENAI_API_KEY"] = settings.openai_api_key
 
 root_agent, runner = build_agents()
+configure_cache(
+    CachePolicy(
+        max_conversations=settings.max_cached_conversations,
+        max_messages=settings.max_cached_messages,
+        ttl_seconds=settings.conversation_ttl_seconds,
+    )
+)
+coalesce_policy = CoalescePolicy(
+    min_delay=settings.coalesce_min_delay,
+    idle_timeout=settings.coalesce_idle_timeout,
+    max_wait=settings.coalesce_max_wait,
+)
+configure_outbox(
+    EmailOutbox(
+        batch_size=settings.email_batch_size,
+        batch_window=settings.email_batch_window_seconds,
+        max_attempts=settings.email_max_attempts,
+        retry_base_delay=settings.email_retry_base_delay_seconds,
+        idle_timeout=settings.email_idle_timeout_seconds,
+    )
+)
+response_cache = (
+    SemanticResponseCache(
+        ResponseCachePolicy(
+            threshold=settings.response_cache_threshold,
+            ttl_seconds=settings.response_cache_ttl_seconds,
+            max_entries=settings.response_cache_size,
+        )
+    )
+    if settings.response_cache_size > 0
+    else None
+)
+scheduler = TurnScheduler(
+    runner=runner,
+    app_name=settings.app_name,
+    max_concurrent_turns=settings.max_concurrent_turns,
+    stream=settings.stream_agent_responses,
+    policy=coalesce_policy,
+    fast_path=settings.fast_path_enabled,
+    response_cache=response_cache,
+    tool_workers=settings.tool_workers,
+)
+supervisor_inbox = build_inbox_service(settings)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    get_outbox().start()
+    if supervisor_inbox is not None:
+        supervisor_inbox.start()
+    yield
+    if supervisor_inbox is not None:
+        await supervisor_inbox.stop()
+    await get_outbox().stop()
+    await close_http_client()
+    # Write out any buffered records before the process exits.
+    await asyncio.to_thread(get_store().close)
+
 
-app = FastAPI(title=settings.app_name)
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,8 +122,30 @@ app.add_middleware(
 
 
 @app.get("/health", tags=["system"])
-def health() -> dict[str, str]:
-    return {"status": "ok"}
+def health() -> dict[str, Any]:
+    body: dict[str, Any] = {"status": "ok"}
+    if supervisor_inbox is not None:
+        # Connection state and how long since the inbox was last checked.
+        inbox = supervisor_inbox.health()
+        body["supervisor_inbox"] = inbox
+        if inbox["status"] != "ok":
+            body["status"] = "degraded"
+    return body
+
+
+@app.get("/metrics", tags=["system"])
+def metrics() -> dict[str, Any]:
+    return {
+        "coalescing": get_coalescing_metrics(),
+        "turns": scheduler.metrics(),
+        "memory": get_memory_metrics(),
+        "tool_cache": TOOL_CACHE.metrics(),
+        "fast_path": get_fast_path_metrics(),
+        "llm": get_llm_metrics(),
+        "email_outbox": get_outbox().metrics(),
+        "escalations": get_escalation_metrics(),
+        "response_cache": response_cache.metrics() if response_cache else None,
+    }
 
 
 @app.get(f"{settings.api_prefix}/activities", tags=["activities"])
@@ -45,40 +154,108 @@ def list_all_activities() -> list[dict[str, Any]]:
 
 
 @app.get(f"{settings.api_prefix}/chat/{{conversation_id}}", response_model=ChatMessageResponse, tags=["chat"])
-def get_chat(conversation_id: str) -> ChatMessageResponse:
-    messages = get_conversation_messages(conversation_id)
-    return ChatMessageResponse(messages=messages)
+async def get_chat(
+    conversation_id: str,
+    since: int = 0,
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    """
+    Return the messages added or changed after the ``since`` rev (all of them by default).
+
+    The ETag is the conversation's last rev, so a client that is already up
+    to date gets an empty 304 without the history being serialized.
+    The body is assembled from each message's cached JSON, so unchanged
+    messages are never re-serialized.
+    """
+    last_rev = await get_last_rev(conversation_id)
+    etag = f'W/"{last_rev}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    messages = await get_messages_since(conversation_id, since)
+    body = b'{"messages":[%s],"last_rev":%d}' % (b",".join(m.to_json() for m in messages), last_rev)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@app.get(f"{settings.api_prefix}/chat/{{conversation_id}}/session", tags=["chat"])
+async def get_session_size(conversation_id: str) -> dict[str, Any]:
+    """Report how large the agent session history is, stored and per turn."""
+    return await session_size(runner.session_service, settings.app_name, conversation_id)
+
+
+def _sse_event(message: MessageRecord) -> str:
+    return f"id: {message.rev}\nevent: message\ndata: {message.to_json().decode()}\n\n"
+
+
+@app.get(f"{settings.api_prefix}/chat/{{conversation_id}}/stream", tags=["chat"])
+async def stream_chat(
+    conversation_id: str,
+    request: Request,
+    since: int = 0,
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    """
+    Push messages to the client as server-sent events as soon as they are stored.
+
+    The event id is the message ``rev``; browsers send it back as
+    ``Last-Event-ID`` on reconnect, so a dropped client resumes without gaps.
+    A streaming draft is also pushed on every chunk, before it is stored.
+    """
+    if last_event_id and last_event_id.isdigit():
+        since = max(since, int(last_event_id))
+
+    async def event_stream() -> AsyncIterator[str]:
+        # Subscribe before reading the backlog so nothing falls in between.
+        subscription = subscribe(conversation_id, max_queue=settings.chat_stream_queue_size)
+        sent_rev = since
+        try:
+            for message in await get_messages_since(conversation_id, since):
+                sent_rev = max(sent_rev, message.rev)
+                yield _sse_event(message)
+
+            while not subscription.dropped or not subscription.queue.empty():
+                try:
+                    message = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=settings.chat_stream_keepalive_seconds,
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Quiet here, but other workers may have stored messages.
+                    missed = await get_messages_since(conversation_id, sent_rev)
+                    for message in missed:
+                        sent_rev = max(sent_rev, message.rev)
+                        yield _sse_event(message)
+                    if not missed:
+                        yield ": keepalive\n\n"
+                    continue
+                if message.rev <= sent_rev and not message.is_draft:
+                    continue
+                sent_rev = max(sent_rev, message.rev)
+                yield _sse_event(message)
+        finally:
+            unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post(f"{settings.api_prefix}/chat/{{conversation_id}}", response_model=ChatMessage, tags=["chat"])
 async def post_chat_message(
     conversation_id: str,
     payload: ChatMessageCreate,
-    background_tasks: BackgroundTasks,
 ) -> ChatMessage:
     # Store user message
-    msg = ChatMessage(
-        id=f"user-{datetime.utcnow().timestamp()}",
-        conversation_id=conversation_id,
-        role=ChatRole.USER,
-        text=payload.text,
-        created_at=datetime.utcnow(),
-    )
-    append_message(msg)
+    msg = await append_message(MessageRecord(conversation_id, ChatRole.USER, payload.text))
 
     # Queue processing by the multi-agent system
-    state = get_or_create_state(conversation_id)
-    state.pending_texts.append(payload.text)
-    if not state.is_processing:
-        state.is_processing = True
-        background_tasks.add_task(
-            process_pending_messages,
-            conversation_id=conversation_id,
-            runner=runner,
-            app_name=settings.app_name,
-        )
+    scheduler.submit(conversation_id, payload.text)
 
-    return msg
+    return msg.to_model()
 
 
 @app.post(
@@ -88,25 +265,71 @@ async def post_chat_message(
 async def supervisor_reply(
     conversation_id: str,
     body: dict[str, str],
+    x_supervisor_token: str | None = Header(default=None),
 ) -> dict[str, str]:
     """
     Endpoint to simulate a supervisor replying to an escalation email.
 
     In a real deployment, this would be called by an email webhook. Here we
     simply inject the supervisor's message into the chat history so the
-    frontend can display it seamlessly.
+    frontend can display it seamlessly. With a valid ``X-Supervisor-Token``
+    an APPROVE/REJECT reply also resolves the conversation's pending
+    escalation.
     """
     message = body.get("message", "").strip()
     if not message:
         return {"status": "ignored", "reason": "empty message"}
 
-    supervisor_msg = ChatMessage(
-        id=f"supervisor-{datetime.utcnow().timestamp()}",
-        conversation_id=conversation_id,
-        role=ChatRole.SUPERVISOR,
-        text=message,
-        created_at=datetime.utcnow(),
+    await deliver_supervisor_replies(
+        [SupervisorReply(message=message, conversation_id=conversation_id)],
+        resolve=_is_supervisor(x_supervisor_token),
     )
-    append_message(supervisor_msg)
     return {"status": "ok"}
 
+
+def _is_supervisor(token: str | None) -> bool:
+    """True when the caller sent the configured SUPERVISOR_REPLY_TOKEN."""
+    expected = settings.supervisor_reply_token
+    return bool(expected and token and hmac.compare_digest(token.encode(), expected.encode()))
+
+
+@app.get(f"{settings.api_prefix}/escalations", response_model=EscalationPage, tags=["human-in-the-loop"])
+def get_escalations(
+    status: EscalationStatus | None = None,
+    booking_id: str | None = None,
+    conversation_id: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+) -> EscalationPage:
+    """
+    Page through escalations, oldest first, filtered by status, booking or conversation.
+
+    ``GET /escalations?status=pending`` is the supervisor backlog. Filters
+    are answered from the store's indexes rather than by scanning.
+    """
+    return EscalationPage(
+        items=list_escalations(booking_id, conversation_id, status, limit, offset),
+        total=count_escalations(booking_id, conversation_id, status),
+        offset=offset,
+        limit=limit,
+    )
+
+
+@app.post(
+    f"{settings.api_prefix}/escalations/supervisor-replies",
+    response_model=list[SupervisorReplyResult],
+    tags=["human-in-the-loop"],
+)
+async def supervisor_replies(
+    replies: list[SupervisorReply],
+    x_supervisor_token: str | None = Header(default=None),
+) -> list[SupervisorReplyResult]:
+    """
+    Deliver a batch of supervisor email replies to their chats.
+
+    Used by the standalone IMAP poller. Each reply is routed by the
+    Message-IDs it answers or the tags in its subject, so the caller does
+    not need to know the conversation. Replies only change booking or
+    escalation status when the request carries a valid ``X-Supervisor-Token``.
+    """
+    return await deliver_supervisor_replies(replies, resolve=_is_supervisor(x_supervisor_token))
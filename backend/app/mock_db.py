@@ -1,16 +1,36 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
-from .models import Activity, ActivityVariation, Booking, BookingStatus, Escalation
+from .models import Activity, ActivityVariation, Booking, BookingStatus, Escalation, EscalationStatus
+from .search_index import ActivitySearchIndex
+from .storage import get_store
 from datetime import datetime
 import uuid
 
 
-# In-memory "database" for activities, bookings, and escalations.
+# In-memory catalog of activities. Bookings and escalations live in the
+# configured store (see storage.py).
 ACTIVITIES: Dict[str, Activity] = {}
-BOOKINGS: Dict[str, Booking] = {}
-ESCALATIONS: Dict[str, Escalation] = {}
+SEARCH_INDEX = ActivitySearchIndex()
+
+# Precomputed catalog indexes, maintained on every catalog change.
+VariationKey = Tuple[str, str]  # (activity_id, variation_id)
+VARIATIONS: Dict[VariationKey, ActivityVariation] = {}
+VARIATIONS_BY_TIME_SLOT: Dict[str, Set[VariationKey]] = {}
+VARIATIONS_BY_PRICE_BAND: Dict[str, Set[VariationKey]] = {}
+VARIATIONS_BY_AVAILABILITY: Dict[bool, Set[VariationKey]] = {True: set(), False: set()}
+
+# Upper bounds (exclusive) of the per-person price bands, in AED.
+PRICE_BANDS: Tuple[Tuple[str, float], ...] = (
+    ("budget", 100.0),
+    ("standard", 300.0),
+    ("premium", float("inf")),
+)
+
+# Bumped on every catalog mutation; caches derived from the catalog key on it.
+CATALOG_VERSION = 0
+_CATALOG: Optional[Tuple[Activity, ...]] = None
 
 
 def _seed_activities() -> None:
@@ -283,11 +303,55 @@ def _seed_activities() -> None:
     ]
 
     ACTIVITIES = {activity.id: activity for activity in activities}
+    SEARCH_INDEX.build(activities)
+    for activity in activities:
+        _index_variations(activity)
+    _catalog_changed()
+
+
+def price_band(price_per_person: float) -> str:
+    for band, upper in PRICE_BANDS:
+        if price_per_person < upper:
+            return band
+    return PRICE_BANDS[-1][0]
+
+
+def _index_variations(activity: Activity) -> None:
+    for variation in activity.variations:
+        key = (activity.id, variation.id)
+        VARIATIONS[key] = variation
+        VARIATIONS_BY_TIME_SLOT.setdefault(variation.time_slot, set()).add(key)
+        VARIATIONS_BY_PRICE_BAND.setdefault(price_band(variation.price_per_person), set()).add(key)
+        VARIATIONS_BY_AVAILABILITY[variation.is_available].add(key)
+
+
+def _unindex_variations(activity: Activity) -> None:
+    for variation in activity.variations:
+        key = (activity.id, variation.id)
+        VARIATIONS.pop(key, None)
+        VARIATIONS_BY_TIME_SLOT.get(variation.time_slot, set()).discard(key)
+        VARIATIONS_BY_PRICE_BAND.get(price_band(variation.price_per_person), set()).discard(key)
+        VARIATIONS_BY_AVAILABILITY[variation.is_available].discard(key)
+
+
+def _catalog_changed() -> None:
+    global CATALOG_VERSION, _CATALOG
+    CATALOG_VERSION += 1
+    _CATALOG = None
 
 
-def list_activities() -> List[Activity]:
+def get_catalog_version() -> int:
     _seed_activities()
-    return list(ACTIVITIES.values())
+    return CATALOG_VERSION
+
+
+def list_activities() -> Tuple[Activity, ...]:
+    """Return the catalog as an immutable tuple, rebuilt only after a change."""
+    global _CATALOG
+    _seed_activities()
+    if _CATALOG is None:
+        _CATALOG = tuple(ACTIVITIES.values())
+    return _CATALOG
 
 
 def get_activity(activity_id: str) -> Activity | None:
@@ -295,6 +359,59 @@ def get_activity(activity_id: str) -> Activity | None:
     return ACTIVITIES.get(activity_id)
 
 
+def get_variation(activity_id: str, variation_id: str) -> ActivityVariation | None:
+    _seed_activities()
+    return VARIATIONS.get((activity_id, variation_id))
+
+
+def find_variations(
+    time_slot: str | None = None,
+    band: str | None = None,
+    available: bool | None = None,
+) -> List[VariationKey]:
+    """Return ``(activity_id, variation_id)`` keys matching all given filters."""
+    _seed_activities()
+    candidates: List[Set[VariationKey]] = []
+    if time_slot is not None:
+        candidates.append(VARIATIONS_BY_TIME_SLOT.get(time_slot, set()))
+    if band is not None:
+        candidates.append(VARIATIONS_BY_PRICE_BAND.get(band, set()))
+    if available is not None:
+        candidates.append(VARIATIONS_BY_AVAILABILITY[available])
+    if not candidates:
+        return list(VARIATIONS)
+    candidates.sort(key=len)
+    return sorted(candidates[0].intersection(*candidates[1:]))
+
+
+def search_activities(query: str, limit: int = 10) -> List[Tuple[Activity, float]]:
+    """Rank catalog activities against a free-text query, best match first."""
+    _seed_activities()
+    return [(ACTIVITIES[activity_id], score) for activity_id, score in SEARCH_INDEX.search(query, limit)]
+
+
+def upsert_activity(activity: Activity) -> None:
+    """Add or replace a catalog activity and keep the search index in sync."""
+    _seed_activities()
+    previous = ACTIVITIES.get(activity.id)
+    if previous is not None:
+        _unindex_variations(previous)
+    ACTIVITIES[activity.id] = activity
+    SEARCH_INDEX.upsert(activity)
+    _index_variations(activity)
+    _catalog_changed()
+
+
+def remove_activity(activity_id: str) -> None:
+    _seed_activities()
+    activity = ACTIVITIES.pop(activity_id, None)
+    if activity is None:
+        return
+    SEARCH_INDEX.remove(activity_id)
+    _unindex_variations(activity)
+    _catalog_changed()
+
+
 def create_booking(
     activity_id: str,
     variation_id: str,
@@ -316,19 +433,58 @@ def create_booking(
         status=status,
         created_at=datetime.utcnow(),
     )
-    BOOKINGS[booking_id] = booking
+    get_store().save_booking(booking)
     return booking
 
 
-def create_escalation(booking: Booking, reason: str, supervisor_email: str) -> Escalation:
+def get_booking(booking_id: str) -> Booking | None:
+    return get_store().get_booking(booking_id)
+
+
+def list_bookings(status: BookingStatus | None = None) -> List[Booking]:
+    return get_store().list_bookings(status)
+
+
+def create_escalation(
+    booking: Booking | None,
+    reason: str,
+    supervisor_email: str,
+    conversation_id: str | None = None,
+) -> Escalation:
     escalation_id = str(uuid.uuid4())
     escalation = Escalation(
         id=escalation_id,
-        booking_id=booking.id,
+        booking_id=booking.id if booking else None,
         reason=reason,
         supervisor_email=supervisor_email,
         created_at=datetime.utcnow(),
+        conversation_id=conversation_id,
     )
-    ESCALATIONS[escalation_id] = escalation
+    get_store().save_escalation(escalation)
     return escalation
 
+
+def save_escalation(escalation: Escalation) -> None:
+    get_store().save_escalation(escalation)
+
+
+def get_escalation(escalation_id: str) -> Escalation | None:
+    return get_store().get_escalation(escalation_id)
+
+
+def list_escalations(
+    booking_id: str | None = None,
+    conversation_id: str | None = None,
+    status: EscalationStatus | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+) -> List[Escalation]:
+    return get_store().list_escalations(booking_id, conversation_id, status, limit, offset)
+
+
+def count_escalations(
+    booking_id: str | None = None,
+    conversation_id: str | None = None,
+    status: EscalationStatus | None = None,
+) -> int:
+    return get_store().count_escalations(booking_id, conversation_id, status)
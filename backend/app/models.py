@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from datetime import datetime
+import json
+import time
+from datetime import datetime, timezone
 from enum import Enum
 from typing import List, Optional
 
@@ -46,14 +48,38 @@ class Booking(BaseModel):
     created_at: datetime
 
 
+class EscalationStatus(str, Enum):
+    PENDING = "pending"
+    APPROVED = "approved"
+    REJECTED = "rejected"
+    # Replied to without an APPROVE/REJECT decision (escalations without a booking).
+    ANSWERED = "answered"
+
+
 class Escalation(BaseModel):
     id: str
-    booking_id: str
+    # None for escalations that are not about a booking.
+    booking_id: Optional[str] = None
     reason: str
     supervisor_email: str
     created_at: datetime
+    # Chat the supervisor's reply belongs in, and the Message-ID of the
+    # escalation email, which the reply carries in In-Reply-To/References.
+    conversation_id: Optional[str] = None
+    message_id: Optional[str] = None
+    status: EscalationStatus = EscalationStatus.PENDING
     resolved_at: Optional[datetime] = None
     supervisor_message: Optional[str] = None
+    # Seconds from creation to resolution.
+    resolution_seconds: Optional[float] = None
+
+
+class EscalationPage(BaseModel):
+    items: List[Escalation]
+    # Matching escalations across all pages.
+    total: int
+    offset: int
+    limit: int
 
 
 class ChatRole(str, Enum):
@@ -69,6 +95,15 @@ class ChatMessage(BaseModel):
     role: ChatRole
     text: str
     created_at: datetime
+    # Position in the conversation, assigned when the message is first stored.
+    seq: int = 0
+    # Per-conversation change counter, bumped every time a version of any
+    # message is stored; clients poll and resume by it.
+    rev: int = 0
+    # True while an assistant reply is still being streamed into this message.
+    is_draft: bool = False
+    # Short status of the tool call the agent is currently waiting on, if any.
+    progress: Optional[str] = None
 
 
 class ChatMessageCreate(BaseModel):
@@ -77,4 +112,134 @@ class ChatMessageCreate(BaseModel):
 
 class ChatMessageResponse(BaseModel):
     messages: List[ChatMessage]
-
+    # Highest rev stored for the conversation; pass it back as ``since`` to
+    # only receive messages added or changed after this poll.
+    last_rev: int = 0
+
+
+class SupervisorReply(BaseModel):
+    """A supervisor's emailed reply plus the headers used to route it."""
+
+    message: str
+    subject: str = ""
+    # Set when the sender already knows the target chat.
+    conversation_id: Optional[str] = None
+    in_reply_to: Optional[str] = None
+    references: Optional[str] = None
+
+
+class SupervisorReplyResult(BaseModel):
+    # "delivered", "unrouted" or "ignored"
+    status: str
+    conversation_id: Optional[str] = None
+    escalation_id: Optional[str] = None
+    escalation_status: Optional[EscalationStatus] = None
+
+
+class MessageRecord:
+    """
+    Compact in-process form of a chat message.
+
+    ``conversation_manager`` keeps these instead of ``ChatMessage`` models:
+    fixed slots, the shared ``ChatRole`` members, a float timestamp and
+    integer ids. The public id is derived as ``"{role}-{number}"``, where
+    ``number`` is the seq the message got when first stored, and ``rev``
+    is bumped whenever a new version is stored. The JSON form is built
+    once and reused until the record changes; ``ChatMessage`` is only
+    materialized at the API edge.
+    """
+
+    __slots__ = (
+        "conversation_id",
+        "number",
+        "seq",
+        "rev",
+        "role",
+        "text",
+        "created_at",
+        "is_draft",
+        "progress",
+        "_json",
+    )
+
+    def __init__(
+        self,
+        conversation_id: str,
+        role: ChatRole,
+        text: str,
+        created_at: Optional[float] = None,
+        seq: int = 0,
+        number: int = 0,
+        is_draft: bool = False,
+        progress: Optional[str] = None,
+        rev: int = 0,
+    ) -> None:
+        self.conversation_id = conversation_id
+        self.role = role
+        self.text = text
+        self.created_at = time.time() if created_at is None else created_at
+        self.seq = seq
+        self.number = number
+        self.rev = rev
+        self.is_draft = is_draft
+        self.progress = progress
+        self._json: Optional[bytes] = None
+
+    @property
+    def id(self) -> str:
+        return f"{self.role.value}-{self.number}"
+
+    def changed(self) -> None:
+        """Drop the cached JSON after a field was modified."""
+        self._json = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "conversation_id": self.conversation_id,
+            "role": self.role.value,
+            "text": self.text,
+            # Naive UTC, as ChatMessage.created_at has always been.
+            "created_at": datetime.fromtimestamp(self.created_at, timezone.utc).replace(tzinfo=None).isoformat(),
+            "seq": self.seq,
+            "rev": self.rev,
+            "is_draft": self.is_draft,
+            "progress": self.progress,
+        }
+
+    def to_json(self) -> bytes:
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), separators=(",", ":")).encode()
+        return self._json
+
+    def to_model(self) -> ChatMessage:
+        return ChatMessage(**self.to_dict())
+
+    @classmethod
+    def from_json(cls, data: str | bytes) -> "MessageRecord":
+        raw = json.loads(data)
+        _, _, number = raw["id"].rpartition("-")
+        return cls(
+            conversation_id=raw["conversation_id"],
+            role=ChatRole(raw["role"]),
+            text=raw["text"],
+            created_at=datetime.fromisoformat(raw["created_at"]).replace(tzinfo=timezone.utc).timestamp(),
+            seq=raw["seq"],
+            number=int(number) if number.isdigit() else raw["seq"],
+            is_draft=raw.get("is_draft", False),
+            progress=raw.get("progress"),
+            rev=raw.get("rev", raw["seq"]),
+        )
+
+    def copy(self) -> "MessageRecord":
+        return MessageRecord(
+            self.conversation_id,
+            self.role,
+            self.text,
+            created_at=self.created_at,
+            seq=self.seq,
+            number=self.number,
+            is_draft=self.is_draft,
+            progress=self.progress,
+            rev=self.rev,
+        )
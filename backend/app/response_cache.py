@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import math
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from .fast_path import detect_intents, is_simple_question, resolve_activity, subject_keywords
+from .mock_db import get_catalog_version
+from .search_index import tokenize
+
+
+# Tools that only read the catalog. A turn that called anything else (or a
+# sub-agent that may book) is never cached.
+READ_ONLY_TOOLS = {
+    "search_activities_tool",
+    "get_activity_details_tool",
+    "get_pricing_for_variation_tool",
+    "information_agent",
+    # With sub-agent transfer the specialist's own tool calls are visible in
+    # the turn, so the handoff itself is harmless.
+    "transfer_to_agent",
+}
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-features embedder that needs no model or network.
+
+    Words and their character trigrams are hashed into ``dim`` buckets and
+    the vector is L2-normalized, so cosine similarity is a dot product.
+    """
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+
+    def _features(self, words: Iterable[str]) -> Iterable[Tuple[str, float]]:
+        for word in words:
+            yield f"w:{word}", 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield f"c:{padded[i:i + 3]}", 0.3
+
+    def embed(self, words: Iterable[str]) -> List[float]:
+        vector = [0.0] * self.dim
+        for feature, weight in self._features(words):
+            vector[zlib.crc32(feature.encode()) % self.dim] += weight
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+
+@dataclass
+class CachedResponse:
+    activity_id: str
+    catalog_version: int
+    vector: List[float]
+    text: str
+    created_at: float
+
+
+@dataclass(frozen=True)
+class ResponseCachePolicy:
+    """Matching and retention rules for cached agent replies.
+
+    A question reuses a stored reply when it is about the same activity, the
+    catalog has not changed since, the reply is younger than ``ttl_seconds``
+    and the two questions' embeddings have cosine similarity of at least
+    ``threshold``. At most ``max_entries`` replies are kept (LRU).
+    """
+
+    threshold: float = 0.85
+    ttl_seconds: float = 600.0
+    max_entries: int = 500
+
+
+class SemanticResponseCache:
+    """
+    Reuses agent replies to near-identical informational questions.
+
+    Only questions that clearly name one catalog activity and contain nothing
+    the agents must act on (bookings, escalations, numbers) are eligible.
+    The question alone does not make a reply safe to share: the model saw
+    the whole session when writing it, so callers must only ``store``
+    replies from turns that started a conversation.
+    """
+
+    def __init__(self, policy: ResponseCachePolicy | None = None, embedder: HashingEmbedder | None = None) -> None:
+        self.policy = policy or ResponseCachePolicy()
+        self.embedder = embedder or HashingEmbedder()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _key(self, text: str) -> Optional[Tuple[str, str, List[str]]]:
+        """Return ``(activity_id, canonical_key, words)``, or None if not cacheable."""
+        if not is_simple_question(text):
+            return None
+        tokens = tokenize(text)
+        activity = resolve_activity(tokens)
+        if activity is None:
+            return None
+        # Intent words are replaced by the intent name, so "cost", "price"
+        # and "how much" all embed the same.
+        words = sorted(set(subject_keywords(tokens)) | set(detect_intents(set(tokens))))
+        return activity.id, f"{activity.id}|{' '.join(words)}", words
+
+    def _prune(self, now: float) -> None:
+        version = get_catalog_version()
+        for key in [
+            k for k, e in self._entries.items()
+            if e.catalog_version != version or now - e.created_at > self.policy.ttl_seconds
+        ]:
+            del self._entries[key]
+            self.expirations += 1
+
+    def lookup(self, text: str) -> Optional[str]:
+        key = self._key(text)
+        if key is None:
+            return None
+        activity_id, canonical, words = key
+        self.lookups += 1
+        self._prune(time.monotonic())
+
+        entry = self._entries.get(canonical)
+        if entry is None:
+            vector = self.embedder.embed(words)
+            best_score = self.policy.threshold
+            for candidate_key, candidate in self._entries.items():
+                if candidate.activity_id != activity_id:
+                    continue
+                score = sum(a * b for a, b in zip(vector, candidate.vector))
+                if score >= best_score:
+                    best_score, entry, canonical = score, candidate, candidate_key
+        if entry is None:
+            return None
+        self.hits += 1
+        self._entries.move_to_end(canonical)
+        return entry.text
+
+    def store(self, text: str, reply: str) -> None:
+        key = self._key(text)
+        if key is None:
+            return
+        activity_id, canonical, words = key
+        self._entries[canonical] = CachedResponse(
+            activity_id=activity_id,
+            catalog_version=get_catalog_version(),
+            vector=self.embedder.embed(words),
+            text=reply,
+            created_at=time.monotonic(),
+        )
+        self._entries.move_to_end(canonical)
+        self.stores += 1
+        while len(self._entries) > self.policy.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def metrics(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
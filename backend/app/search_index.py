@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .models import Activity
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words in an activity name say more about it than words in its description.
+NAME_WEIGHT = 2
+# Shortest query token that is also matched as a prefix ("saf" -> "safari").
+MIN_PREFIX_LEN = 3
+# Score multiplier for prefix matches relative to exact term matches.
+PREFIX_MATCH_WEIGHT = 0.7
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class ActivitySearchIndex:
+    """
+    Inverted index over the activity catalog with BM25 ranking.
+
+    Postings map each term to the activities containing it (with term
+    frequency), so a query only touches the documents that share a term with
+    it. A prefix table lets partial words match, and activities can be added,
+    replaced or removed one at a time without rebuilding the index.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def build(self, activities: Iterable[Activity]) -> None:
+        for activity in activities:
+            self.upsert(activity)
+
+    def upsert(self, activity: Activity) -> None:
+        """Index an activity, replacing any previous version of it."""
+        self.remove(activity.id)
+
+        terms = Counter(tokenize(activity.description))
+        for token in tokenize(activity.name):
+            terms[token] += NAME_WEIGHT
+
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._add_prefixes(term)
+            postings[activity.id] = tf
+
+        length = sum(terms.values())
+        self._doc_terms[activity.id] = terms
+        self._doc_lengths[activity.id] = length
+        self._total_length += length
+
+    def remove(self, activity_id: str) -> None:
+        terms = self._doc_terms.pop(activity_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[activity_id]
+            if not postings:
+                del self._postings[term]
+                self._remove_prefixes(term)
+        self._total_length -= self._doc_lengths.pop(activity_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Return up to ``limit`` ``(activity_id, score)`` pairs, best first."""
+        doc_count = len(self._doc_terms)
+        if not doc_count or limit <= 0:
+            return []
+        avg_length = self._total_length / doc_count
+
+        scores: Dict[str, float] = {}
+        for token in set(tokenize(query)):
+            for term, weight in self._expand(token):
+                postings = self._postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for activity_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[activity_id] / avg_length)
+                    score = weight * idf * tf * (self.k1 + 1) / (tf + norm)
+                    scores[activity_id] = scores.get(activity_id, 0.0) + score
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Terms a query token matches: itself exactly, plus longer terms it prefixes."""
+        matches: List[Tuple[str, float]] = []
+        if token in self._postings:
+            matches.append((token, 1.0))
+        if len(token) >= MIN_PREFIX_LEN:
+            for term in self._prefixes.get(token, ()):
+                if term != token:
+                    matches.append((term, PREFIX_MATCH_WEIGHT))
+        return matches
+
+    def _add_prefixes(self, term: str) -> None:
+        for end in range(MIN_PREFIX_LEN, len(term) + 1):
+            self._prefixes.setdefault(term[:end], set()).add(term)
+
+    def _remove_prefixes(self, term: str) -> None:
+        for end in range(MIN_PREFIX_LEN, len(term) + 1):
+            prefix = term[:end]
+            terms = self._prefixes.get(prefix)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._prefixes[prefix]
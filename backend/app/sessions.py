@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.sqlite_session_service import SqliteSessionService
+from google.genai import types as genai_types
+
+from .config import get_settings
+
+
+SUMMARY_PREFIX = "[Summary of earlier conversation]"
+
+
+@dataclass(frozen=True)
+class HistoryPolicy:
+    """How much session history an agent turn gets to see.
+
+    Only the last ``max_events`` events are sent to the model. With
+    ``summarize`` on, the turns that fall out of the window are condensed
+    into one extractive summary message (no extra LLM call), capped at
+    ``summary_max_chars``.
+    """
+
+    max_events: int = 40
+    summarize: bool = True
+    summary_source_events: int = 40
+    summary_max_chars: int = 1200
+
+
+def _event_text(event: Event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return " ".join(p.text for p in event.content.parts if getattr(p, "text", None)).strip()
+
+
+def _starts_turn(event: Event) -> bool:
+    return event.author == "user" and not event.get_function_responses()
+
+
+def _summarize(events: List[Event], max_chars: int) -> Optional[Event]:
+    """Condense dropped events into a single user-authored summary event."""
+    lines: List[str] = []
+    used = 0
+    full = False
+    # Walk backwards so the most recent context survives the size cap.
+    for event in reversed(events):
+        text = _event_text(event)
+        if not text:
+            continue
+        if text.startswith(SUMMARY_PREFIX):
+            # An earlier summary: carry its lines forward as the oldest context.
+            candidates = list(reversed(text[len(SUMMARY_PREFIX):].strip().splitlines()))
+        else:
+            candidates = [f"{event.author}: {text[:200]}"]
+        for line in candidates:
+            if used + len(line) > max_chars:
+                full = True
+                break
+            lines.append(line)
+            used += len(line) + 1
+        if full:
+            break
+    if not lines:
+        return None
+    lines.append(SUMMARY_PREFIX)
+    return Event(
+        author="user",
+        invocation_id=events[-1].invocation_id,
+        timestamp=events[-1].timestamp,
+        content=genai_types.Content(
+            role="user",
+            parts=[genai_types.Part(text="\n".join(reversed(lines)))],
+        ),
+    )
+
+
+def compact_events(events: List[Event], policy: HistoryPolicy) -> List[Event]:
+    """
+    Cut history to the last ``policy.max_events`` events.
+
+    The window always starts at a user message, so a tool response is never
+    sent without the call that produced it.
+    """
+    if len(events) <= policy.max_events:
+        return events
+    cut = len(events) - policy.max_events
+    while cut < len(events) and not _starts_turn(events[cut]):
+        cut += 1
+    kept = events[cut:]
+    if policy.summarize:
+        summary = _summarize(events[:cut], policy.summary_max_chars)
+        if summary is not None:
+            kept = [summary, *kept]
+    return kept
+
+
+class _CompactingMixin:
+    """Applies a HistoryPolicy to the sessions handed to the runner."""
+
+    policy: HistoryPolicy
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        if config is not None:
+            # Explicit configs (e.g. size reports) get the raw history.
+            return await super().get_session(  # type: ignore[misc]
+                app_name=app_name, user_id=user_id, session_id=session_id, config=config
+            )
+        fetch = self.policy.max_events
+        if self.policy.summarize:
+            fetch += self.policy.summary_source_events
+        session = await super().get_session(  # type: ignore[misc]
+            app_name=app_name,
+            user_id=user_id,
+            session_id=session_id,
+            config=GetSessionConfig(num_recent_events=fetch),
+        )
+        if session is not None:
+            session.events = compact_events(session.events, self.policy)
+        return session
+
+
+class CompactingInMemorySessionService(_CompactingMixin, InMemorySessionService):
+    """
+    In-memory sessions whose stored history is itself kept bounded.
+
+    Once a session holds twice the window, its stored events are compacted in
+    place, so memory per conversation stays flat.
+    """
+
+    def __init__(self, policy: HistoryPolicy) -> None:
+        super().__init__()
+        self.policy = policy
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        stored = self.sessions.get(session.app_name, {}).get(session.user_id, {}).get(session.id)
+        if stored is not None and len(stored.events) > 2 * self.policy.max_events:
+            stored.events = compact_events(stored.events, self.policy)
+        return event
+
+
+class CompactingSqliteSessionService(_CompactingMixin, SqliteSessionService):
+    """
+    Durable sessions in a local SQLite file.
+
+    Sessions live on disk and only the bounded window is loaded for a turn,
+    so idle conversations take no memory and survive restarts.
+    """
+
+    def __init__(self, db_path: str, policy: HistoryPolicy) -> None:
+        super().__init__(db_path)
+        self.policy = policy
+
+
+async def session_size(service, app_name: str, session_id: str) -> dict:
+    """Report the stored and the per-turn (windowed) size of a session."""
+    full = await service.get_session(
+        app_name=app_name,
+        user_id=session_id,
+        session_id=session_id,
+        config=GetSessionConfig(),
+    )
+    if full is None:
+        return {"exists": False}
+    window = await service.get_session(app_name=app_name, user_id=session_id, session_id=session_id)
+
+    def measure(events: List[Event]) -> dict:
+        size = sum(len(e.model_dump_json(exclude_none=True)) for e in events)
+        return {"events": len(events), "bytes": size, "estimated_tokens": size // 4}
+
+    return {
+        "exists": True,
+        "stored": measure(full.events),
+        "per_turn": measure(window.events if window else []),
+    }
+
+
+def build_session_service():
+    """Create the ADK session service selected by the storage settings."""
+    settings = get_settings()
+    policy = HistoryPolicy(
+        max_events=settings.session_max_events,
+        summarize=settings.session_summarize,
+    )
+    if settings.storage_backend == "sqlite":
+        return CompactingSqliteSessionService(settings.session_db_path, policy)
+    return CompactingInMemorySessionService(policy)
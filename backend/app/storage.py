@@ -0,0 +1,625 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from .config import get_settings
+from .models import Booking, BookingStatus, Escalation, EscalationStatus, MessageRecord
+
+T = TypeVar("T")
+
+
+class Store(ABC):
+    """
+    Persistence for chat messages, bookings and escalations.
+
+    ``conversation_manager`` and ``mock_db`` keep their hot data in process
+    and write through to a store, so the backend can be swapped without
+    touching the callers.
+    """
+
+    # True when other processes may write to the same store, so cached
+    # conversations have to be checked against it before being served.
+    shared = False
+    # True when calls do blocking I/O; async callers then run them in a
+    # worker thread instead of on the event loop.
+    blocking = False
+
+    @abstractmethod
+    def append_message(self, message: MessageRecord) -> "Future[MessageRecord]":
+        """Store a new message, or a new version of a stored one.
+
+        A new message (``seq`` 0) gets the conversation's next ``seq``, and
+        that as its ``number`` when it has none yet; a stored version with
+        the same id is replaced. Every call gives the message the
+        conversation's next ``rev``. Allocating these and writing the
+        message are one atomic step, so processes sharing a store never
+        reuse one. The returned future resolves to the message once it is
+        stored; until then the caller must not touch it.
+        """
+
+    @abstractmethod
+    def last_message_rev(self, conversation_id: str) -> int:
+        """Return the highest rev stored for the conversation, 0 if it has none."""
+
+    @abstractmethod
+    def load_messages(
+        self,
+        conversation_id: str,
+        since: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[MessageRecord]:
+        """Return the conversation's messages with ``rev > since`` in rev order.
+
+        With ``limit``, only the newest ``limit`` of those are returned.
+        """
+
+    @abstractmethod
+    def save_booking(self, booking: Booking) -> None: ...
+
+    @abstractmethod
+    def get_booking(self, booking_id: str) -> Optional[Booking]: ...
+
+    @abstractmethod
+    def list_bookings(self, status: Optional[BookingStatus] = None) -> List[Booking]: ...
+
+    @abstractmethod
+    def save_escalation(self, escalation: Escalation) -> None: ...
+
+    @abstractmethod
+    def get_escalation(self, escalation_id: str) -> Optional[Escalation]: ...
+
+    @abstractmethod
+    def list_escalations(
+        self,
+        booking_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        status: Optional[EscalationStatus] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Escalation]:
+        """Return the escalations matching every given filter, oldest first.
+
+        ``limit`` and ``offset`` select one page of that ordering.
+        """
+
+    @abstractmethod
+    def count_escalations(
+        self,
+        booking_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        status: Optional[EscalationStatus] = None,
+    ) -> int: ...
+
+    @abstractmethod
+    def find_escalation_by_message_id(self, message_id: str) -> Optional[Escalation]:
+        """Return the escalation whose email was sent with ``message_id``."""
+
+    def flush(self) -> None:
+        """Write out anything buffered. A no-op for unbuffered stores."""
+
+    def close(self) -> None:
+        self.flush()
+
+
+_ESCALATION_INDEXED_FIELDS = ("booking_id", "conversation_id", "status")
+
+
+class InMemoryStore(Store):
+    """
+    Process-local store; state is lost on restart.
+
+    Messages are bounded so memory stays flat: only the newest
+    ``max_messages`` per conversation are kept, and the least recently
+    written conversations beyond ``max_conversations`` are dropped. Their
+    last seq and rev are remembered, so a conversation that comes back
+    never reuses one.
+    """
+
+    def __init__(self, max_conversations: int = 10000, max_messages: int = 1000) -> None:
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        # Least recently written first.
+        self._messages: "OrderedDict[str, Dict[int, MessageRecord]]" = OrderedDict()
+        # conversation id -> (last seq, last rev)
+        self._counters: Dict[str, Tuple[int, int]] = {}
+        self._bookings: Dict[str, Booking] = {}
+        self._escalations: Dict[str, Escalation] = {}
+        self._escalations_by_message_id: Dict[str, str] = {}
+        # field -> value -> escalation ids, for the list_escalations filters
+        self._escalation_index: Dict[str, Dict[object, Set[str]]] = {
+            field: {} for field in _ESCALATION_INDEXED_FIELDS
+        }
+        # Values each escalation is indexed under; callers may mutate the
+        # stored model in place, so its current fields cannot be trusted.
+        self._escalation_keys: Dict[str, Tuple[object, ...]] = {}
+
+    def append_message(self, message: MessageRecord) -> "Future[MessageRecord]":
+        conversation_id = message.conversation_id
+        last_seq, last_rev = self._counters.get(conversation_id, (0, 0))
+        if not message.seq:
+            message.seq = last_seq = last_seq + 1
+        if not message.number:
+            message.number = message.seq
+        message.rev = last_rev + 1
+        self._counters[conversation_id] = (last_seq, message.rev)
+        message.changed()
+        messages = self._messages.setdefault(conversation_id, {})
+        self._messages.move_to_end(conversation_id)
+        messages[message.number] = message
+        if len(messages) > self.max_messages:
+            del messages[next(iter(messages))]
+        if len(self._messages) > self.max_conversations:
+            self._messages.popitem(last=False)
+        stored: "Future[MessageRecord]" = Future()
+        stored.set_result(message)
+        return stored
+
+    def last_message_rev(self, conversation_id: str) -> int:
+        return self._counters.get(conversation_id, (0, 0))[1]
+
+    def load_messages(
+        self,
+        conversation_id: str,
+        since: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[MessageRecord]:
+        messages = self._messages.get(conversation_id, {}).values()
+        ordered = sorted((m for m in messages if m.rev > since), key=lambda m: m.rev)
+        return ordered[-limit:] if limit else ordered
+
+    def save_booking(self, booking: Booking) -> None:
+        self._bookings[booking.id] = booking
+
+    def get_booking(self, booking_id: str) -> Optional[Booking]:
+        return self._bookings.get(booking_id)
+
+    def list_bookings(self, status: Optional[BookingStatus] = None) -> List[Booking]:
+        return [b for b in self._bookings.values() if status is None or b.status == status]
+
+    def save_escalation(self, escalation: Escalation) -> None:
+        keys = tuple(getattr(escalation, field) for field in _ESCALATION_INDEXED_FIELDS)
+        previous = self._escalation_keys.get(escalation.id)
+        for i, field in enumerate(_ESCALATION_INDEXED_FIELDS):
+            index = self._escalation_index[field]
+            if previous is not None:
+                index.get(previous[i], set()).discard(escalation.id)
+            index.setdefault(keys[i], set()).add(escalation.id)
+        self._escalation_keys[escalation.id] = keys
+        self._escalations[escalation.id] = escalation
+        if escalation.message_id:
+            self._escalations_by_message_id[escalation.message_id] = escalation.id
+
+    def get_escalation(self, escalation_id: str) -> Optional[Escalation]:
+        return self._escalations.get(escalation_id)
+
+    def _matching_escalation_ids(self, **filters: object) -> Set[str]:
+        selected = [
+            self._escalation_index[field].get(value, set())
+            for field, value in filters.items()
+            if value is not None
+        ]
+        if not selected:
+            return set(self._escalations)
+        selected.sort(key=len)
+        return selected[0].intersection(*selected[1:])
+
+    def list_escalations(
+        self,
+        booking_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        status: Optional[EscalationStatus] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Escalation]:
+        ids = self._matching_escalation_ids(booking_id=booking_id, conversation_id=conversation_id, status=status)
+        ordered = sorted((self._escalations[i] for i in ids), key=lambda e: (e.created_at, e.id))
+        return ordered[offset:offset + limit] if limit is not None else ordered[offset:]
+
+    def count_escalations(
+        self,
+        booking_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        status: Optional[EscalationStatus] = None,
+    ) -> int:
+        return len(self._matching_escalation_ids(booking_id=booking_id, conversation_id=conversation_id, status=status))
+
+    def find_escalation_by_message_id(self, message_id: str) -> Optional[Escalation]:
+        escalation_id = self._escalations_by_message_id.get(message_id)
+        return self._escalations.get(escalation_id) if escalation_id else None
+
+
+_MESSAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, id)
+)"""
+_MESSAGES_INDEX = "CREATE INDEX IF NOT EXISTS idx_messages_conversation_seq ON messages (conversation_id, seq)"
+
+_SCHEMA = f"""
+{_MESSAGES_TABLE};
+{_MESSAGES_INDEX};
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status);
+
+CREATE TABLE IF NOT EXISTS escalations (
+    id TEXT PRIMARY KEY,
+    booking_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_escalations_booking ON escalations (booking_id);
+"""
+
+# Columns added after a table was first shipped, as
+# (table, column, definition, backfill expression). They are added with
+# ALTER TABLE on open and filled in from the JSON of rows already stored.
+_ADDED_COLUMNS = [
+    ("escalations", "message_id", "TEXT", "json_extract(data, '$.message_id')"),
+    ("escalations", "conversation_id", "TEXT", "json_extract(data, '$.conversation_id')"),
+    (
+        "escalations",
+        "status",
+        "TEXT NOT NULL DEFAULT 'pending'",
+        "COALESCE(json_extract(data, '$.status'), 'pending')",
+    ),
+    ("escalations", "created_at", "TEXT", "json_extract(data, '$.created_at')"),
+    ("messages", "rev", "INTEGER NOT NULL DEFAULT 0", "seq"),
+]
+
+def _migrate_messages_key(conn: sqlite3.Connection) -> None:
+    """
+    Rebuild a messages table keyed by ``id`` alone (the original schema).
+
+    Message ids are only unique within a conversation, so the key became
+    ``(conversation_id, id)``. SQLite cannot change a primary key in place,
+    so the rows are copied into a new table in one transaction.
+    """
+    key = [row[1] for row in sorted(conn.execute("PRAGMA table_info(messages)"), key=lambda r: r[5]) if row[5]]
+    if key != ["id"]:
+        return
+    print("[SQLiteStore] Migrating messages to the (conversation_id, id) key")
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("ALTER TABLE messages RENAME TO messages_by_id")
+    conn.execute("DROP INDEX IF EXISTS idx_messages_conversation_seq")
+    conn.execute(_MESSAGES_TABLE)
+    conn.execute(
+        "INSERT OR REPLACE INTO messages (conversation_id, id, seq, data) "
+        "SELECT conversation_id, id, seq, data FROM messages_by_id ORDER BY seq"
+    )
+    conn.execute("DROP TABLE messages_by_id")
+    conn.execute(_MESSAGES_INDEX)
+
+
+_ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_escalations_message_id ON escalations (message_id);
+CREATE INDEX IF NOT EXISTS idx_escalations_conversation ON escalations (conversation_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_escalations_status ON escalations (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_rev ON messages (conversation_id, rev);
+"""
+
+_UPSERTS = {
+    "messages": (
+        "INSERT INTO messages (conversation_id, id, seq, rev, data) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(conversation_id, id) DO UPDATE SET seq = excluded.seq, rev = excluded.rev, data = excluded.data"
+    ),
+    "bookings": (
+        "INSERT INTO bookings (id, status, data) VALUES (?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET status = excluded.status, data = excluded.data"
+    ),
+    "escalations": (
+        "INSERT INTO escalations (id, booking_id, message_id, conversation_id, status, created_at, data) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET booking_id = excluded.booking_id, "
+        "message_id = excluded.message_id, conversation_id = excluded.conversation_id, "
+        "status = excluded.status, created_at = excluded.created_at, data = excluded.data"
+    ),
+}
+
+
+class SQLiteStore(Store):
+    """
+    SQLite-backed store, shareable between worker processes.
+
+    The database runs in WAL mode so readers never block the writer.
+    Booking and escalation writes are buffered and flushed in one
+    transaction per batch, when the batch is full, when ``flush_interval``
+    has passed, or before any read so a process always sees its own writes.
+    Messages go to a writer thread that stores whatever has queued up in
+    one transaction, allocating seqs and revs inside it, so no reader sees
+    a rev before every lower one is stored. Connections come from a small pool so
+    request threads do not open a new one per query. Every call blocks, so
+    async code runs them in worker threads.
+    """
+
+    shared = True
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        pool_size: int = 4,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+            _migrate_messages_key(conn)
+            for table, column, definition, backfill in _ADDED_COLUMNS:
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    conn.execute(f"UPDATE {table} SET {column} = {backfill}")
+            conn.executescript(_ADDED_INDEXES)
+
+        self._pending: List[Tuple[str, tuple]] = []
+        self._pending_lock = threading.Lock()
+        # Serializes flushes so batches reach the database in enqueue order.
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="sqlite-store-flush", daemon=True)
+        self._flusher.start()
+        # Messages waiting for the writer thread; None asks it to stop.
+        self._appends: "queue.Queue[Optional[Tuple[MessageRecord, Future]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_messages, name="sqlite-store-messages", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            with conn:  # commits on success, rolls back on error
+                yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _enqueue(self, table: str, row: tuple) -> None:
+        with self._pending_lock:
+            self._pending.append((table, row))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            by_table: Dict[str, List[tuple]] = {}
+            for table, row in pending:
+                by_table.setdefault(table, []).append(row)
+            with self._connection() as conn:
+                for table, rows in by_table.items():
+                    conn.executemany(_UPSERTS[table], rows)
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                print(f"[SQLiteStore] Background flush failed: {exc}")
+
+    def close(self) -> None:
+        self._closed.set()
+        self._appends.put(None)
+        self._writer.join()
+        self.flush()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        self.flush()
+        with self._connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def append_message(self, message: MessageRecord) -> "Future[MessageRecord]":
+        stored: "Future[MessageRecord]" = Future()
+        self._appends.put((message, stored))
+        return stored
+
+    def _write_messages(self) -> None:
+        """Writer thread: store queued messages, everything queued so far in one transaction."""
+        stopping = False
+        while not stopping:
+            batch = [self._appends.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._appends.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+            if not batch:
+                continue
+            try:
+                self._store_messages([message for message, _ in batch])
+            except Exception as exc:
+                print(f"[SQLiteStore] Writing {len(batch)} message(s) failed: {exc}")
+                for _, stored in batch:
+                    stored.set_exception(exc)
+            else:
+                for message, stored in batch:
+                    stored.set_result(message)
+
+    def _store_messages(self, messages: List[MessageRecord]) -> None:
+        with self._connection() as conn:
+            # Take the write lock before reading the counters, so writers in
+            # other processes queue up here instead of reusing a seq or rev.
+            conn.execute("BEGIN IMMEDIATE")
+            counters: Dict[str, List[int]] = {}
+            rows = []
+            for message in messages:
+                conversation_id = message.conversation_id
+                if conversation_id not in counters:
+                    counters[conversation_id] = list(
+                        conn.execute(
+                            "SELECT (SELECT COALESCE(MAX(seq), 0) FROM messages WHERE conversation_id = ?), "
+                            "(SELECT COALESCE(MAX(rev), 0) FROM messages WHERE conversation_id = ?)",
+                            (conversation_id, conversation_id),
+                        ).fetchone()
+                    )
+                last = counters[conversation_id]
+                if not message.seq:
+                    last[0] += 1
+                    message.seq = last[0]
+                if not message.number:
+                    message.number = message.seq
+                last[1] += 1
+                message.rev = last[1]
+                message.changed()
+                rows.append((conversation_id, message.id, message.seq, message.rev, message.to_json().decode()))
+            conn.executemany(_UPSERTS["messages"], rows)
+
+    def last_message_rev(self, conversation_id: str) -> int:
+        # Messages are never buffered, so there is nothing to flush first.
+        with self._connection() as conn:
+            (last_rev,) = conn.execute(
+                "SELECT COALESCE(MAX(rev), 0) FROM messages WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+        return last_rev
+
+    def load_messages(
+        self,
+        conversation_id: str,
+        since: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[MessageRecord]:
+        rows = self._query(
+            "SELECT data FROM messages WHERE conversation_id = ? AND rev > ? "
+            "ORDER BY rev DESC LIMIT ?",
+            (conversation_id, since, limit if limit else -1),
+        )
+        return [MessageRecord.from_json(data) for (data,) in reversed(rows)]
+
+    def save_booking(self, booking: Booking) -> None:
+        self._enqueue("bookings", (booking.id, booking.status.value, booking.model_dump_json()))
+
+    def get_booking(self, booking_id: str) -> Optional[Booking]:
+        rows = self._query("SELECT data FROM bookings WHERE id = ?", (booking_id,))
+        return Booking.model_validate_json(rows[0][0]) if rows else None
+
+    def list_bookings(self, status: Optional[BookingStatus] = None) -> List[Booking]:
+        if status is None:
+            rows = self._query("SELECT data FROM bookings")
+        else:
+            rows = self._query("SELECT data FROM bookings WHERE status = ?", (status.value,))
+        return [Booking.model_validate_json(data) for (data,) in rows]
+
+    def save_escalation(self, escalation: Escalation) -> None:
+        # booking_id is NOT NULL in the original schema; "" marks "no booking".
+        self._enqueue(
+            "escalations",
+            (
+                escalation.id,
+                escalation.booking_id or "",
+                escalation.message_id,
+                escalation.conversation_id,
+                escalation.status.value,
+                # Same ISO format as the JSON, so it sorts chronologically.
+                escalation.created_at.isoformat(),
+                escalation.model_dump_json(),
+            ),
+        )
+
+    def get_escalation(self, escalation_id: str) -> Optional[Escalation]:
+        rows = self._query("SELECT data FROM escalations WHERE id = ?", (escalation_id,))
+        return Escalation.model_validate_json(rows[0][0]) if rows else None
+
+    @staticmethod
+    def _escalation_filters(
+        booking_id: Optional[str],
+        conversation_id: Optional[str],
+        status: Optional[EscalationStatus],
+    ) -> Tuple[str, List[object]]:
+        clauses, params = [], []
+        for column, value in (
+            ("booking_id", booking_id),
+            ("conversation_id", conversation_id),
+            ("status", status.value if status is not None else None),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def list_escalations(
+        self,
+        booking_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        status: Optional[EscalationStatus] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Escalation]:
+        where, params = self._escalation_filters(booking_id, conversation_id, status)
+        rows = self._query(
+            f"SELECT data FROM escalations{where} ORDER BY created_at, id LIMIT ? OFFSET ?",
+            (*params, limit if limit is not None else -1, offset),
+        )
+        return [Escalation.model_validate_json(data) for (data,) in rows]
+
+    def count_escalations(
+        self,
+        booking_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        status: Optional[EscalationStatus] = None,
+    ) -> int:
+        where, params = self._escalation_filters(booking_id, conversation_id, status)
+        return self._query(f"SELECT COUNT(*) FROM escalations{where}", params)[0][0]
+
+    def find_escalation_by_message_id(self, message_id: str) -> Optional[Escalation]:
+        rows = self._query("SELECT data FROM escalations WHERE message_id = ?", (message_id,))
+        return Escalation.model_validate_json(rows[0][0]) if rows else None
+
+
+@lru_cache
+def get_store() -> Store:
+    """Return the process-wide store selected by ``STORAGE_BACKEND``."""
+    settings = get_settings()
+    if settings.storage_backend == "sqlite":
+        return SQLiteStore(
+            settings.sqlite_path,
+            pool_size=settings.sqlite_pool_size,
+            batch_size=settings.sqlite_batch_size,
+            flush_interval=settings.sqlite_flush_interval,
+        )
+    return InMemoryStore(
+        max_conversations=settings.memory_store_max_conversations,
+        max_messages=settings.memory_store_max_messages,
+    )
+
+
+async def call_store(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a store call from async code, in a worker thread when the store blocks."""
+    if get_store().blocking:
+        return await asyncio.to_thread(function, *args, **kwargs)
+    return function(*args, **kwargs)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .conversation_manager import append_message
+from .models import (
+    BookingStatus,
+    ChatRole,
+    Escalation,
+    EscalationStatus,
+    MessageRecord,
+    SupervisorReply,
+    SupervisorReplyResult,
+)
+from .storage import Store, call_store, get_store
+
+
+# Tags that agents.py writes into escalation subjects, e.g.
+# "[conversation_id=demo-conversation][escalation_id=...]".
+CONV_RE = re.compile(r"conversation_id=([A-Za-z0-9_\-]+)")
+ESCALATION_RE = re.compile(r"escalation_id=([A-Za-z0-9_\-]+)")
+MESSAGE_ID_RE = re.compile(r"<[^<>\s]+>")
+# The escalation email asks the supervisor to reply with APPROVE or REJECT.
+DECISION_RE = re.compile(r"^\W*(approved?|reject(?:ed)?)\b", re.IGNORECASE)
+
+
+@dataclass
+class ResolutionMetrics:
+    resolved: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    by_status: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, status: EscalationStatus, seconds: float) -> None:
+        self.resolved += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.by_status[status.value] = self.by_status.get(status.value, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "resolved": self.resolved,
+            "avg_resolution_seconds": self.total_seconds / self.resolved if self.resolved else 0.0,
+            "max_resolution_seconds": self.max_seconds,
+            "by_status": dict(self.by_status),
+        }
+
+
+RESOLUTION_METRICS = ResolutionMetrics()
+
+
+def get_escalation_metrics() -> dict:
+    return {
+        "pending": get_store().count_escalations(status=EscalationStatus.PENDING),
+        **RESOLUTION_METRICS.as_dict(),
+    }
+
+
+def parse_decision(message: str) -> Optional[EscalationStatus]:
+    """Read APPROVE/REJECT from the first word of a reply; None when neither."""
+    match = DECISION_RE.match(message)
+    if not match:
+        return None
+    return EscalationStatus.APPROVED if match.group(1).lower().startswith("approve") else EscalationStatus.REJECTED
+
+
+def _replied_message_ids(reply: SupervisorReply) -> Iterable[str]:
+    # In-Reply-To names the mail answered directly; References lists the
+    # thread oldest first, so walk it from the end.
+    yield from MESSAGE_ID_RE.findall(reply.in_reply_to or "")
+    yield from reversed(MESSAGE_ID_RE.findall(reply.references or ""))
+
+
+def _pending_escalation(store: Store, conversation_id: str) -> Optional[Escalation]:
+    # Only unambiguous when the conversation has a single open escalation.
+    pending = store.list_escalations(conversation_id=conversation_id, status=EscalationStatus.PENDING, limit=2)
+    return pending[0] if len(pending) == 1 else None
+
+
+def route_supervisor_reply(reply: SupervisorReply) -> Tuple[Optional[str], Optional[Escalation]]:
+    """
+    Find the conversation (and escalation, if known) a supervisor reply belongs to.
+
+    Tried in order: an explicit ``conversation_id``, the Message-IDs the mail
+    answers, the escalation id tag in the subject and finally the
+    conversation id tag in the subject. Message-IDs come first among the
+    email-derived hints because they survive a supervisor editing the subject.
+    When only the conversation is known, its single pending escalation (if
+    there is exactly one) is taken as the one answered.
+    """
+    store = get_store()
+    if reply.conversation_id:
+        return reply.conversation_id, _pending_escalation(store, reply.conversation_id)
+
+    for message_id in _replied_message_ids(reply):
+        escalation = store.find_escalation_by_message_id(message_id)
+        if escalation and escalation.conversation_id:
+            return escalation.conversation_id, escalation
+
+    match = ESCALATION_RE.search(reply.subject)
+    if match:
+        escalation = store.get_escalation(match.group(1))
+        if escalation and escalation.conversation_id:
+            return escalation.conversation_id, escalation
+
+    match = CONV_RE.search(reply.subject)
+    if match:
+        return match.group(1), _pending_escalation(store, match.group(1))
+    return None, None
+
+
+def record_supervisor_reply(escalation: Escalation, message: str) -> Escalation:
+    """
+    Apply a supervisor's reply to its escalation and, for bookings, the booking.
+
+    A reply starting with APPROVE or REJECT resolves the escalation and moves
+    a pending booking to CONFIRMED or REJECTED. Any reply resolves an
+    escalation without a booking (as ANSWERED unless it carries a decision).
+    Other replies about a booking are stored as the latest supervisor
+    message while the escalation stays pending. Resolved escalations are
+    left unchanged.
+    """
+    if escalation.status != EscalationStatus.PENDING:
+        return escalation
+
+    store = get_store()
+    escalation.supervisor_message = message
+    decision = parse_decision(message)
+    if decision is None and escalation.booking_id:
+        store.save_escalation(escalation)
+        return escalation
+
+    escalation.status = decision or EscalationStatus.ANSWERED
+    escalation.resolved_at = datetime.utcnow()
+    escalation.resolution_seconds = (escalation.resolved_at - escalation.created_at).total_seconds()
+    store.save_escalation(escalation)
+    RESOLUTION_METRICS.record(escalation.status, escalation.resolution_seconds)
+
+    if escalation.booking_id:
+        booking = store.get_booking(escalation.booking_id)
+        if booking is not None and booking.status == BookingStatus.PENDING_SUPERVISOR:
+            booking.status = (
+                BookingStatus.CONFIRMED if decision == EscalationStatus.APPROVED else BookingStatus.REJECTED
+            )
+            store.save_booking(booking)
+            print(f"[SupervisorReplies] Booking {booking.id} is now {booking.status.value}")
+    return escalation
+
+
+async def deliver_supervisor_replies(
+    replies: List[SupervisorReply],
+    resolve: bool = False,
+) -> List[SupervisorReplyResult]:
+    """
+    Route each reply, append it to its chat and, with ``resolve``, apply it to its escalation.
+
+    ``resolve`` may only be set for replies known to come from the
+    supervisor (the in-process IMAP poller, or an HTTP caller holding
+    ``SUPERVISOR_REPLY_TOKEN``); otherwise anyone could approve a booking.
+    Returns one result per reply, in order.
+    """
+    results = []
+    for reply in replies:
+        message = reply.message.strip()
+        if not message:
+            results.append(SupervisorReplyResult(status="ignored"))
+            continue
+
+        conversation_id, escalation = await call_store(route_supervisor_reply, reply)
+        if not conversation_id:
+            print(f"[SupervisorReplies] No conversation found for reply: subject={reply.subject}")
+            results.append(SupervisorReplyResult(status="unrouted"))
+            continue
+
+        await append_message(MessageRecord(conversation_id, ChatRole.SUPERVISOR, message))
+        if escalation is not None and resolve:
+            escalation = await call_store(record_supervisor_reply, escalation, message)
+        results.append(
+            SupervisorReplyResult(
+                status="delivered",
+                conversation_id=conversation_id,
+                escalation_id=escalation.id if escalation else None,
+                escalation_status=escalation.status if escalation else None,
+            )
+        )
+    return results
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+from .mock_db import get_catalog_version
+
+
+class ToolCache:
+    """
+    LRU memo of tool results for tools that are pure functions of the catalog.
+
+    Entries are keyed on the tool name and its arguments and are only valid
+    for the catalog version they were computed against; the first lookup
+    after a catalog change drops everything. Cached payloads are returned
+    as-is, so callers must treat them as read-only.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._version = -1
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self) -> None:
+        version = get_catalog_version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._check_version()
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+TOOL_CACHE = ToolCache()
+
+
+def _freeze(arguments: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple((name, json.dumps(value, sort_keys=True, default=str)) for name, value in arguments.items())
+
+
+def cached_tool(func: Callable[..., dict]) -> Callable[..., dict]:
+    """Memoize a read-only tool in ``TOOL_CACHE``; the signature is kept for ADK."""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> dict:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__name__, _freeze(bound.arguments))
+        return TOOL_CACHE.get_or_compute(key, lambda: func(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import weakref
+from typing import Any, Awaitable, Callable
+
+from google.adk.tools.tool_context import ToolContext
+
+
+# One lock per session, dropped once no call holds or waits on it.
+_SESSION_LOCKS: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _SESSION_LOCKS.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _SESSION_LOCKS[session_id] = lock
+    return lock
+
+
+def serialized_tool(func: Callable[..., Awaitable[dict]]) -> Callable[..., Awaitable[dict]]:
+    """
+    Run a side-effecting async tool one call at a time per conversation.
+
+    ADK starts all function calls of a model step concurrently, in the order
+    the model issued them. The lock is acquired in that same order, so side
+    effects (bookings, escalation emails) happen one after another and in the
+    order requested, while read-only calls in the same step still overlap.
+
+    The wrapper asks ADK for the ``tool_context`` to find the session; the
+    parameter is not part of the declaration the model sees.
+    """
+    signature = inspect.signature(func)
+    wants_context = "tool_context" in signature.parameters
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, tool_context: ToolContext, **kwargs: Any) -> dict:
+        if wants_context:
+            kwargs["tool_context"] = tool_context
+        async with _session_lock(tool_context.session.id):
+            return await func(*args, **kwargs)
+
+    if not wants_context:
+        wrapper.__signature__ = signature.replace(  # type: ignore[attr-defined]
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter("tool_context", inspect.Parameter.KEYWORD_ONLY, annotation=ToolContext),
+            ]
+        )
+    return wrapper
@@ -0,0 +1,124 @@
+"""
+Measure how many conversations the backend serves at once.
+
+The agents are built as usual, but every LiteLlm model gets a stub client
+that answers after ``--latency`` seconds instead of calling a provider:
+the first call of a turn asks for ``search_activities_tool``, the next one
+replies with text. ``--conversations`` turns are started together and the
+total wall time is reported for
+
+- ``async``: ``conversation_manager.run_turn``, which consumes
+  ``runner.run_async`` and leaves the event loop free while waiting;
+- ``sync``: the loop the backend used to run, iterating the blocking
+  ``runner.run`` generator on the event loop.
+
+With the async path the wall time stays near that of a single turn; with
+the blocking one it grows with every conversation. No API key or network
+access is needed.
+
+    cd backend
+    python bench_concurrency.py --conversations 10 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, List
+
+# Settings insists on a key; the stub client never uses it.
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from google.adk.models.lite_llm import LiteLLMClient
+from litellm import ModelResponse
+
+from app import llm
+from app.agents import build_agents, build_user_message
+from app.config import get_settings
+from app.conversation_manager import get_conversation_messages, run_turn
+
+
+class StubLiteLLMClient(LiteLLMClient):
+    """Answers like a provider would, after a fixed delay."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    async def acompletion(self, model: Any, messages: Any, tools: Any, **kwargs: Any) -> ModelResponse:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        tool_names = {tool["function"]["name"] for tool in tools or []}
+        if messages[-1]["role"] != "tool" and "search_activities_tool" in tool_names:
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{uuid.uuid4().hex[:8]}",
+                        "type": "function",
+                        "function": {"name": "search_activities_tool", "arguments": json.dumps({"query": "safari"})},
+                    }
+                ],
+            }
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": "Here are the desert safaris."}
+            finish_reason = "stop"
+        return ModelResponse(model=model, choices=[{"index": 0, "message": message, "finish_reason": finish_reason}])
+
+
+async def run_blocking_turn(conversation_id: str, runner, text: str) -> None:
+    # What the backend did before: the sync generator blocks the event loop.
+    for _event in runner.run(
+        user_id=conversation_id,
+        session_id=conversation_id,
+        new_message=build_user_message(text),
+    ):
+        pass
+
+
+async def measure(mode: str, conversations: int, latency: float) -> None:
+    settings = get_settings()
+    _, runner = build_agents()
+    client = StubLiteLLMClient(latency)
+    for model in llm._MODELS.values():
+        model.llm_client = client
+
+    conversation_ids = [f"bench-{mode}-{i}" for i in range(conversations)]
+    for conversation_id in conversation_ids:
+        await runner.session_service.create_session(
+            app_name=settings.app_name, user_id=conversation_id, session_id=conversation_id
+        )
+
+    text = "Which desert safaris do you have?"
+    if mode == "async":
+        turns: List = [run_turn(cid, [text], runner, settings.app_name) for cid in conversation_ids]
+    else:
+        turns = [run_blocking_turn(cid, runner, text) for cid in conversation_ids]
+    started = time.perf_counter()
+    await asyncio.gather(*turns)
+    elapsed = time.perf_counter() - started
+
+    replies = sum([len(await get_conversation_messages(cid)) for cid in conversation_ids]) if mode == "async" else "-"
+    print(
+        f"{mode:<6} {conversations:>13} {client.calls:>9} {elapsed:>9.2f}  "
+        f"{elapsed / conversations:>12.3f}  {replies}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=10, help="turns started at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per model call")
+    parser.add_argument("--mode", choices=["async", "sync"], action="append", help="default: both")
+    options = parser.parse_args()
+
+    print(f"{'mode':<6} {'conversations':>13} {'llm calls':>9} {'wall s':>9}  {'s per conv':>12}  replies")
+    for mode in options.mode or ["async", "sync"]:
+        await measure(mode, options.conversations, options.latency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
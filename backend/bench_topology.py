@@ -0,0 +1,159 @@
+"""
+Compare the agent topologies (AGENT_TOPOLOGY) by LLM calls and latency.
+
+Every agent talks to a scripted stand-in for the LLM that behaves like a
+well-behaved model: it routes to the right specialist, calls the one tool
+the scenario needs and then answers. Each model call sleeps ``--latency``
+seconds, so the wall time shows what every routing hop costs. No API key
+or network access is needed.
+
+In ``nested`` mode the root also holds the catalog and booking tools;
+``--direct`` lets it call them itself instead of going through the
+specialist.
+
+    cd backend
+    python bench_topology.py --latency 0.3 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Dict, List
+
+# Settings insists on a key; the scripted model never uses it.
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types as genai_types
+
+from app import agents
+from app.agents import ROUTING_HINTS, build_agents, build_user_message
+from app.config import get_settings
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    text: str
+    specialist: str
+    tool: str
+    args: Dict[str, object] = field(default_factory=dict)
+
+
+SCENARIOS = [
+    Scenario(
+        name="pricing",
+        text="How much is the Burj Khalifa outside prime hours?",
+        specialist="information_agent",
+        tool="get_pricing_for_variation_tool",
+        args={"activity_id": "burj-khalifa-observation", "variation_id": "non-prime-standard"},
+    ),
+    Scenario(
+        name="booking",
+        text="Book the shared desert safari for 2 on 2026-12-01, Sam Lee, sam@example.com",
+        specialist="booking_agent",
+        tool="book_activity_tool",
+        args={
+            "activity_id": "desert-safari",
+            "variation_id": "safari-shared-4x4",
+            "customer_name": "Sam Lee",
+            "customer_email": "sam@example.com",
+            "group_size": 2,
+            "date": "2026-12-01",
+        },
+    ),
+]
+
+
+class ScriptedLlm(BaseLlm):
+    """Plays a model that routes to the scenario's specialist, then calls its tool."""
+
+    model: str = "scripted"
+    latency: float = 0.0
+    scenario: Scenario = SCENARIOS[0]
+    direct: bool = False
+    calls: int = 0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        yield LlmResponse(content=genai_types.Content(role="model", parts=[self._next_part(llm_request)]))
+
+    def _next_part(self, llm_request: LlmRequest) -> genai_types.Part:
+        scenario = self.scenario
+        last = llm_request.contents[-1] if llm_request.contents else None
+        answered = [p.function_response.name for p in (last.parts if last else None) or [] if p.function_response]
+        if answered and answered[-1] != "transfer_to_agent":
+            return genai_types.Part(text=f"Done: {scenario.name}.")
+
+        tools = llm_request.tools_dict
+        if scenario.specialist in tools and not self.direct:
+            call = genai_types.FunctionCall(name=scenario.specialist, args={"request": scenario.text})
+        elif scenario.tool in tools:
+            call = genai_types.FunctionCall(name=scenario.tool, args=dict(scenario.args))
+        else:
+            call = genai_types.FunctionCall(name="transfer_to_agent", args={"agent_name": scenario.specialist})
+        return genai_types.Part(function_call=call)
+
+
+@dataclass
+class Result:
+    llm_calls: int
+    tool_calls: int
+    seconds: float
+    reply_author: str
+
+
+async def run_scenario(topology: str, scenario: Scenario, latency: float, direct: bool, run: int) -> Result:
+    os.environ["AGENT_TOPOLOGY"] = topology
+    get_settings.cache_clear()
+    model = ScriptedLlm(latency=latency, scenario=scenario, direct=direct)
+    agents.get_model = lambda settings, role: model
+    _, runner = build_agents()
+
+    session_id = f"bench-{topology}-{scenario.name}-{run}"
+    await runner.session_service.create_session(app_name=runner.app_name, user_id=session_id, session_id=session_id)
+    tool_calls = 0
+    reply_author = ""
+    started = time.perf_counter()
+    async for event in runner.run_async(
+        user_id=session_id,
+        session_id=session_id,
+        new_message=build_user_message(scenario.text),
+    ):
+        tool_calls += len(event.get_function_calls())
+        if event.is_final_response() and event.content:
+            reply_author = event.author
+    return Result(model.calls, tool_calls, time.perf_counter() - started, reply_author)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per model call")
+    parser.add_argument("--runs", type=int, default=3, help="turns per topology and scenario")
+    parser.add_argument("--topology", action="append", choices=sorted(ROUTING_HINTS), help="default: all")
+    parser.add_argument("--direct", action="store_true", help="let the nested root skip its specialists")
+    options = parser.parse_args()
+
+    print(f"{'topology':<10} {'scenario':<9} {'llm calls':>9} {'tool calls':>10} {'avg s':>7}  answered by")
+    for topology in options.topology or list(ROUTING_HINTS):
+        for scenario in SCENARIOS:
+            results: List[Result] = [
+                await run_scenario(topology, scenario, options.latency, options.direct, run)
+                for run in range(options.runs)
+            ]
+            last = results[-1]
+            seconds = sum(r.seconds for r in results) / len(results)
+            print(
+                f"{topology:<10} {scenario.name:<9} {last.llm_calls:>9} {last.tool_calls:>10} "
+                f"{seconds:>7.2f}  {last.reply_author}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
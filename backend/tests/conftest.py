@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the backend as ``app``, like uvicorn does from this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings insists on a key; nothing under test calls a provider.
+os.environ.setdefault("OPENAI_API_KEY", "unused")
@@ -0,0 +1,248 @@
+"""
+A small in-process IMAP server for tests.
+
+It serves one mailbox and understands what ``app.imap`` sends: LOGIN,
+SELECT, NOOP, IDLE, LOGOUT and UID SEARCH/FETCH/STORE. Every command line
+is recorded in ``commands``, and mail added with ``add_message`` is
+announced to sessions that are idling, like a real server would.
+"""
+from __future__ import annotations
+
+import email
+import re
+import socketserver
+import threading
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from typing import Callable, List, Optional, Set
+
+
+def make_mail(sender: str, subject: str, body: str, attachment: Optional[bytes] = None) -> bytes:
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = "assistant@example.com"
+    message["Subject"] = subject
+    message["Message-ID"] = email.utils.make_msgid(domain="example.com")
+    message.set_content(body)
+    if attachment is not None:
+        message.add_attachment(attachment, maintype="application", subtype="octet-stream", filename="a.bin")
+    return message.as_bytes()
+
+
+class StoredMail:
+    def __init__(self, uid: int, raw: bytes) -> None:
+        self.uid = uid
+        self.raw = raw
+        self.flags: Set[str] = set()
+        self.internaldate = datetime.now(timezone.utc)
+
+
+def _uid_set(spec: str, max_uid: int) -> Set[int]:
+    uids: Set[int] = set()
+    for part in spec.split(","):
+        first, _, last = part.partition(":")
+        low = max_uid if first == "*" else int(first)
+        high = low if not last else max_uid if last == "*" else int(last)
+        uids.update(range(min(low, high), max(low, high) + 1))
+    return uids
+
+
+def _bodystructure(part: email.message.Message) -> str:
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        return f'({children} "{part.get_content_subtype().upper()}")'
+    payload = part.get_payload(decode=True) or b""
+    maintype, subtype = part.get_content_maintype().upper(), part.get_content_subtype().upper()
+    charset = part.get_content_charset() or "us-ascii"
+    encoding = (part.get("Content-Transfer-Encoding") or "7bit").upper()
+    structure = f'("{maintype}" "{subtype}" ("CHARSET" "{charset}") NIL NIL "{encoding}" {len(payload)}'
+    if maintype == "TEXT":
+        structure += " %d" % payload.count(b"\n")
+    disposition = part.get("Content-Disposition") or ""
+    if "attachment" in disposition.lower():
+        structure += ' NIL ("ATTACHMENT" ("FILENAME" "a.bin")) NIL NIL'
+    return structure + ")"
+
+
+def _section(message: email.message.Message, raw: bytes, path: str) -> bytes:
+    if not path:
+        return raw
+    if path.startswith("HEADER.FIELDS"):
+        names = re.search(r"\((.*)\)", path).group(1).split()
+        lines = [f"{name}: {value}" for name in names for value in message.get_all(name, [])]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode()
+    part = message
+    for index in path.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+    payload = part.get_payload(decode=False)
+    return payload.encode() if isinstance(payload, str) else b""
+
+
+class ImapStub:
+    """An IMAP server on a free local port; use as a context manager."""
+
+    def __init__(self, uidvalidity: int = 1000) -> None:
+        self.uidvalidity = uidvalidity
+        self.messages: List[StoredMail] = []
+        self.next_uid = 1
+        self.commands: List[str] = []
+        self.connections = 0
+        # Send "* n EXISTS" in the same packet as the IDLE continuation.
+        self.exists_with_continuation = False
+        self._idlers: Set[Callable[[str], None]] = set()
+        self._lock = threading.Lock()
+        self._server: Optional[socketserver.ThreadingTCPServer] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def __enter__(self) -> "ImapStub":
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                stub._serve(self)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_message(self, raw: bytes) -> int:
+        with self._lock:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.messages.append(StoredMail(uid, raw))
+            exists = len(self.messages)
+            idlers = list(self._idlers)
+        for send in idlers:
+            send(f"* {exists} EXISTS")
+        return uid
+
+    def renumber(self, uidvalidity: int) -> None:
+        """Start a new mailbox generation: new UIDVALIDITY, UIDs from 1 again."""
+        with self._lock:
+            self.uidvalidity = uidvalidity
+            for uid, mail in enumerate(self.messages, 1):
+                mail.uid = uid
+            self.next_uid = len(self.messages) + 1
+
+    def flags(self, uid: int) -> Set[str]:
+        return next(mail.flags for mail in self.messages if mail.uid == uid)
+
+    def _serve(self, handler: socketserver.StreamRequestHandler) -> None:
+        self.connections += 1
+        write_lock = threading.Lock()
+
+        def send(line: str | bytes) -> None:
+            data = line if isinstance(line, bytes) else (line + "\r\n").encode()
+            with write_lock:
+                handler.wfile.write(data)
+                handler.wfile.flush()
+
+        send("* OK stub ready")
+        while True:
+            line = handler.rfile.readline()
+            if not line:
+                return
+            line = line.decode().rstrip("\r\n")
+            self.commands.append(line)
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            if command == "CAPABILITY":
+                send("* CAPABILITY IMAP4rev1 IDLE")
+                send(f"{tag} OK done")
+            elif command == "LOGIN":
+                send(f"{tag} OK logged in")
+            elif command == "SELECT":
+                send(f"* {len(self.messages)} EXISTS")
+                send(f"* OK [UIDVALIDITY {self.uidvalidity}] ok")
+                send(f"* OK [UIDNEXT {self.next_uid}] ok")
+                send(f"{tag} OK [READ-WRITE] selected")
+            elif command == "NOOP":
+                send(f"* {len(self.messages)} EXISTS")
+                send(f"{tag} OK noop")
+            elif command == "LOGOUT":
+                send("* BYE")
+                send(f"{tag} OK bye")
+                return
+            elif command == "IDLE":
+                if not self._idle(handler, send, tag):
+                    return
+            elif command == "UID":
+                subcommand, _, args = args.partition(" ")
+                with self._lock:
+                    self._uid_command(send, tag, subcommand.upper(), args)
+            else:
+                send(f"{tag} BAD unknown {command}")
+
+    def _idle(self, handler: socketserver.StreamRequestHandler, send: Callable, tag: str) -> bool:
+        if self.exists_with_continuation:
+            send(f"+ idling\r\n* {len(self.messages)} EXISTS")
+        else:
+            send("+ idling")
+        self._idlers.add(send)
+        try:
+            while True:
+                line = handler.rfile.readline()
+                if not line:
+                    return False
+                self.commands.append(line.decode().rstrip("\r\n"))
+                if line.strip().upper() == b"DONE":
+                    break
+        finally:
+            self._idlers.discard(send)
+        send(f"{tag} OK idle done")
+        return True
+
+    def _uid_command(self, send: Callable, tag: str, subcommand: str, args: str) -> None:
+        max_uid = self.messages[-1].uid if self.messages else 0
+        if subcommand == "SEARCH":
+            found = list(self.messages)
+            tokens = args.split()
+            for i, token in enumerate(tokens):
+                if token.upper() == "UID":
+                    uids = _uid_set(tokens[i + 1], max_uid)
+                    found = [mail for mail in found if mail.uid in uids]
+                elif token.upper() == "UNSEEN":
+                    found = [mail for mail in found if "\\Seen" not in mail.flags]
+            send("* SEARCH" + "".join(f" {mail.uid}" for mail in found))
+            send(f"{tag} OK search")
+        elif subcommand == "FETCH":
+            spec, _, items = args.partition(" ")
+            uids = _uid_set(spec, max_uid)
+            for number, mail in enumerate(self.messages, 1):
+                if mail.uid in uids:
+                    send(self._fetch_response(number, mail, items))
+            send(f"{tag} OK fetch")
+        elif subcommand == "STORE":
+            spec, _, change = args.partition(" ")
+            for mail in self.messages:
+                if mail.uid in _uid_set(spec, max_uid) and "\\SEEN" in change.upper():
+                    mail.flags.add("\\Seen")
+            send(f"{tag} OK store")
+        else:
+            send(f"{tag} BAD unknown UID {subcommand}")
+
+    def _fetch_response(self, number: int, mail: StoredMail, items: str) -> bytes:
+        message = email.message_from_bytes(mail.raw)
+        fields = [f"UID {mail.uid}"]
+        if "INTERNALDATE" in items.upper():
+            fields.append(f'INTERNALDATE "{mail.internaldate.strftime("%d-%b-%Y %H:%M:%S +0000")}"')
+        if "BODYSTRUCTURE" in items.upper():
+            fields.append(f"BODYSTRUCTURE {_bodystructure(message)}")
+        response = f"* {number} FETCH ({' '.join(fields)}".encode()
+        for match in re.finditer(r"BODY(\.PEEK)?\[([^\]]*)\]", items, re.IGNORECASE):
+            path = match.group(2).upper()
+            data = _section(message, mail.raw, path)
+            if not match.group(1):
+                mail.flags.add("\\Seen")
+            response += f" BODY[{path}] {{{len(data)}}}\r\n".encode() + data
+        return response + b")\r\n"
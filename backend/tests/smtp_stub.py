@@ -0,0 +1,93 @@
+"""
+A small in-process SMTP server for tests.
+
+Mail is accepted into ``messages``. ``replies`` maps a command (``MAIL``,
+``RCPT`` or ``DATA``) to a queue of replies to give instead of accepting,
+e.g. ``stub.replies["DATA"] = ["451 4.3.0 try later"]``; the reply
+``"drop"`` closes the connection instead of answering.
+"""
+from __future__ import annotations
+
+import socketserver
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+class SmtpStub:
+    """An SMTP server on a free local port; use as a context manager."""
+
+    def __init__(self) -> None:
+        self.messages: List[str] = []
+        self.commands: List[str] = []
+        self.replies: Dict[str, List[str]] = defaultdict(list)
+        self.connections = 0
+        self._server: Optional[socketserver.ThreadingTCPServer] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def __enter__(self) -> "SmtpStub":
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                stub._serve(self)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, command: str) -> int:
+        return sum(1 for line in self.commands if line.split(" ")[0].upper() == command)
+
+    def _serve(self, handler: socketserver.StreamRequestHandler) -> None:
+        self.connections += 1
+
+        def send(line: str) -> None:
+            handler.wfile.write((line + "\r\n").encode())
+
+        send("220 stub ready")
+        while True:
+            line = handler.rfile.readline().decode().rstrip("\r\n")
+            if not line:
+                return
+            self.commands.append(line)
+            command = line.split(" ")[0].upper()
+            if command in ("EHLO", "HELO"):
+                send("250 stub")
+            elif command in ("MAIL", "RCPT"):
+                reply = self._next_reply(command)
+                if reply == "drop":
+                    return
+                send(reply or "250 ok")
+            elif command == "DATA":
+                send("354 go ahead")
+                data = []
+                while True:
+                    data_line = handler.rfile.readline().decode()
+                    if data_line in (".\r\n", ".\n", ""):
+                        break
+                    data.append(data_line)
+                reply = self._next_reply(command)
+                if reply == "drop":
+                    return
+                if not reply:
+                    self.messages.append("".join(data))
+                send(reply or "250 queued")
+            elif command in ("NOOP", "RSET"):
+                send("250 ok")
+            elif command == "QUIT":
+                send("221 bye")
+                return
+            else:
+                send("502 not implemented")
+
+    def _next_reply(self, command: str) -> Optional[str]:
+        return self.replies[command].pop(0) if self.replies[command] else None
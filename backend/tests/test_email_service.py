@@ -0,0 +1,123 @@
+import asyncio
+import smtplib
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.email_service import EmailOutbox, _is_transient
+
+from smtp_stub import SmtpStub
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with SmtpStub() as server:
+        monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+        monkeypatch.setenv("SMTP_PORT", str(server.port))
+        monkeypatch.setenv("SMTP_FROM_EMAIL", "assistant@example.com")
+        monkeypatch.setenv("SUPERVISOR_EMAIL", "boss@example.com")
+        get_settings.cache_clear()
+        yield server
+    get_settings.cache_clear()
+
+
+def make_outbox(**kwargs):
+    options = dict(batch_window=0.01, max_attempts=3, retry_base_delay=0.01, retry_max_delay=0.05)
+    options.update(kwargs)
+    return EmailOutbox(**options)
+
+
+def send(outbox, *subjects):
+    """Queue ``subjects`` and wait until every one was sent or given up on."""
+
+    async def run():
+        for subject in subjects:
+            outbox.enqueue(subject, "body")
+        deadline = time.monotonic() + 10
+        while outbox.sent + outbox.failed < len(subjects) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(run())
+    return outbox
+
+
+def test_is_transient():
+    assert _is_transient(smtplib.SMTPDataError(451, b"try later"))
+    assert not _is_transient(smtplib.SMTPDataError(554, b"spam"))
+    assert not _is_transient(smtplib.SMTPAuthenticationError(535, b"bad credentials"))
+    assert _is_transient(smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"busy")}))
+    assert not _is_transient(smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"no such user")}))
+    assert _is_transient(smtplib.SMTPServerDisconnected("gone"))
+    assert _is_transient(ConnectionRefusedError())
+    assert _is_transient(TimeoutError())
+    assert not _is_transient(smtplib.SMTPNotSupportedError("no STARTTLS"))
+    assert not _is_transient(ValueError("bad header"))
+
+
+def test_batch_goes_out_over_one_connection(stub):
+    outbox = send(make_outbox(), "one", "two", "three")
+    assert outbox.sent == 3
+    assert len(stub.messages) == 3
+    assert stub.connections == 1
+
+
+def test_temporary_rejection_is_retried(stub):
+    stub.replies["DATA"] = ["451 4.3.0 try later", "421 4.7.0 slow down"]
+    outbox = send(make_outbox(), "retry me")
+    assert (outbox.sent, outbox.retried, outbox.failed) == (1, 2, 0)
+    assert len(stub.messages) == 1
+    assert stub.count("DATA") == 3
+
+
+def test_permanent_rejection_is_not_retried(stub):
+    stub.replies["DATA"] = ["554 5.7.1 message refused"]
+    outbox = send(make_outbox(), "refused", "fine")
+    assert (outbox.sent, outbox.retried, outbox.failed) == (1, 0, 1)
+    assert stub.count("DATA") == 2
+    # The session survives a rejected mail.
+    assert stub.connections == 1
+
+
+def test_permanently_refused_recipient_is_not_retried(stub):
+    stub.replies["RCPT"] = ["550 5.1.1 no such user"]
+    outbox = send(make_outbox(), "nobody")
+    assert (outbox.sent, outbox.retried, outbox.failed) == (0, 0, 1)
+    assert stub.count("MAIL") == 1
+
+
+def test_retries_stop_after_max_attempts(stub):
+    stub.replies["MAIL"] = ["452 4.3.1 out of space"] * 5
+    outbox = send(make_outbox(max_attempts=3), "full")
+    assert (outbox.sent, outbox.retried, outbox.failed) == (0, 2, 1)
+    assert stub.count("MAIL") == 3
+
+
+def test_dropped_connection_is_reopened(stub):
+    outbox = make_outbox()
+
+    async def run():
+        outbox.enqueue("first", "body")
+        while outbox.sent < 1:
+            await asyncio.sleep(0.01)
+        # The kept-alive session is gone by the time the next mail goes out.
+        stub.replies["MAIL"] = ["drop"]
+        outbox.enqueue("second", "body")
+        while outbox.sent < 2:
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+    assert (outbox.sent, outbox.retried, outbox.failed) == (2, 0, 0)
+    assert stub.connections == 2
+    assert len(stub.messages) == 2
+
+
+def test_unreachable_server_is_retried(stub, monkeypatch):
+    with SmtpStub() as closed:
+        port = closed.port
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    get_settings.cache_clear()
+    outbox = send(make_outbox(max_attempts=2), "nowhere")
+    assert (outbox.sent, outbox.retried, outbox.failed) == (0, 1, 1)
@@ -0,0 +1,58 @@
+import pytest
+
+from app.config import Settings
+from app.fast_path import try_fast_path
+from app.mock_db import get_activity
+
+
+def test_off_unless_enabled(monkeypatch):
+    monkeypatch.delenv("FAST_PATH_ENABLED", raising=False)
+    assert Settings().fast_path_enabled is False
+    monkeypatch.setenv("FAST_PATH_ENABLED", "true")
+    assert Settings().fast_path_enabled is True
+
+
+@pytest.mark.parametrize(
+    "text, intents, activity_id",
+    [
+        ("How much is the Burj Khalifa?", ["price"], "burj-khalifa-observation"),
+        ("What is the cancellation policy for the desert safari?", ["cancellation"], "desert-safari"),
+        ("Can I reschedule the dhow cruise?", ["reschedule"], "dubai-marina-cruise"),
+        ("What are the policies for Burj Khalifa?", ["policy"], "burj-khalifa-observation"),
+        ("Show me photos of the Dubai Frame", ["images"], "dubai-frame"),
+        ("What's the price and refund policy of Aquaventure?", ["price", "cancellation"], "aquaventure"),
+    ],
+)
+def test_answers_simple_catalog_questions(text, intents, activity_id):
+    reply = try_fast_path(text)
+    assert reply is not None
+    assert reply.intents == intents
+    activity = get_activity(activity_id)
+    assert activity.name in reply.text
+    if "images" in intents:
+        assert reply.text.endswith("\n".join(str(url) for url in activity.images))
+    if "cancellation" in intents:
+        assert activity.cancellation_policy in reply.text
+
+
+def test_lists_activities():
+    reply = try_fast_path("What activities do you have?")
+    assert reply.intents == ["listing"]
+    assert "Dubai Miracle Garden Entry" in reply.text
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Book the desert safari",
+        "Desert safari for 4 people price",
+        "Which is better, Burj Khalifa or the frame?",
+        "I need to talk to a human about the safari price",
+        "Any discount on the Burj Khalifa price?",
+        "How much is it?",
+        "price of the tour",
+        "Hello there",
+    ],
+)
+def test_leaves_everything_else_to_the_agents(text):
+    assert try_fast_path(text) is None
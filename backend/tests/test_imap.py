@@ -0,0 +1,321 @@
+import asyncio
+import imaplib
+import json
+import threading
+import time
+
+import pytest
+
+from app.config import Settings
+from app.imap import MailboxState, SupervisorInbox, SupervisorInboxService, _fetch_records, _parse_sexp
+
+from imap_stub import ImapStub, make_mail
+
+SUPERVISOR = "boss@example.com"
+TAG = "[Dubai Travel Assistant]"
+
+
+class Deliveries:
+    def __init__(self):
+        self.replies = []
+
+    def __call__(self, replies):
+        self.replies.extend(replies)
+        return [{"status": "delivered", "conversation_id": "c1"} for _ in replies]
+
+
+@pytest.fixture
+def stub():
+    with ImapStub() as server:
+        yield server
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "imap_state.json")
+
+
+def make_inbox(stub, state_path, deliver=None, **kwargs):
+    return SupervisorInbox(
+        host="127.0.0.1",
+        port=stub.port,
+        username="assistant",
+        password="secret",
+        supervisor_email=SUPERVISOR,
+        deliver=deliver or Deliveries(),
+        state_path=state_path,
+        use_ssl=False,
+        timeout_seconds=5,
+        **kwargs,
+    )
+
+
+def reply(body="APPROVE", subject=f"Re: {TAG} Booking BK-1"):
+    return make_mail(SUPERVISOR, subject, body)
+
+
+def test_parse_sexp_lists_strings_literals_and_nil():
+    data = b'(("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 12 1) "MIXED") tail'
+    value, end = _parse_sexp(data)
+    assert value == [["TEXT", "PLAIN", ["CHARSET", "utf-8"], None, None, "7BIT", "12", "1"], "MIXED"]
+    assert data[end:] == b" tail"
+
+
+def test_parse_sexp_unescapes_quoted_strings_and_reads_literals():
+    value, _ = _parse_sexp(b'("a \\"quoted\\" \\\\ name" {5}\r\nab)cd NIL)')
+    assert value == ['a "quoted" \\ name', "ab)cd", None]
+
+
+def test_parse_sexp_starts_at_pos_and_rejects_garbage():
+    data = b"BODYSTRUCTURE (\"TEXT\" \"HTML\")"
+    value, end = _parse_sexp(data, len(b"BODYSTRUCTURE "))
+    assert value == ["TEXT", "HTML"]
+    assert end == len(data)
+    with pytest.raises(ValueError):
+        _parse_sexp(b")")
+
+
+def test_fetch_records_groups_by_uid_and_splits_out_the_section():
+    data = [
+        (b'1 (UID 7 INTERNALDATE "01-Jan-2026 10:00:00 +0000" BODY[HEADER.FIELDS (FROM)] {19}', b"From: a@example.com"),
+        b")",
+        # imaplib hands back every literal, even mid-line, as (prefix, literal).
+        (b'2 (UID 9 BODYSTRUCTURE ("TEXT" "PLAIN" ("NAME" {5}', b"a b.c"),
+        (b') NIL NIL "7BIT" 3 1) BODY[1] {3}', b"hey"),
+        b")",
+    ]
+    records = _fetch_records(data)
+    assert set(records) == {7, 9}
+    meta, section = records[7]
+    assert section == b"From: a@example.com"
+    assert meta.endswith(b"BODY[HEADER.FIELDS (FROM)] NIL)")
+    meta, section = records[9]
+    assert section == b"hey"
+    # The BODYSTRUCTURE literal stays in the metadata and still parses.
+    start = meta.find(b"BODYSTRUCTURE ") + len(b"BODYSTRUCTURE ")
+    structure, _ = _parse_sexp(meta, start)
+    assert structure[2] == ["NAME", "a b.c"]
+
+
+def test_fetch_records_without_section():
+    assert _fetch_records([b"3 (UID 12 FLAGS (\\Seen))", None]) == {12: (b"3 (UID 12 FLAGS (\\Seen))", None)}
+
+
+def test_fetch_summaries_and_bodies_from_server(stub, state_path):
+    first = stub.add_message(reply("APPROVE\n\n> quoted"))
+    second = stub.add_message(make_mail(SUPERVISOR, f"{TAG} with file", "see attached", attachment=b"\x00\x01"))
+    inbox = make_inbox(stub, state_path)
+    inbox.connect()
+    try:
+        summaries = inbox.fetch_summaries([first, second])
+        assert summaries[first].headers["From"] == SUPERVISOR
+        assert summaries[first].text_part.section == "1"
+        assert summaries[second].text_part.section == "1"
+        bodies = inbox.fetch_bodies(list(summaries.values()))
+        assert bodies[first].startswith("APPROVE")
+        assert bodies[second] == "see attached"
+        # Only PEEKs so far; nothing is flagged before delivery.
+        assert stub.flags(first) == set()
+    finally:
+        inbox.close()
+
+
+def test_process_new_mail_delivers_replies_and_marks_everything_seen(stub, state_path):
+    deliveries = Deliveries()
+    stub.add_message(make_mail("someone@example.com", f"{TAG} hello", "not the supervisor"))
+    uid = stub.add_message(reply("APPROVE\n\nOn Monday someone wrote:\n> old text"))
+    inbox = make_inbox(stub, state_path, deliver=deliveries)
+    inbox.connect()
+    try:
+        assert inbox.process_new_mail() == 2
+    finally:
+        inbox.close()
+    assert [r["message"] for r in deliveries.replies] == ["APPROVE"]
+    assert all("\\Seen" in stub.flags(u) for u in (1, uid))
+    assert json.load(open(state_path)) == {"uidvalidity": 1000, "last_uid": uid}
+
+
+def test_resume_from_last_uid(stub, state_path):
+    stub.add_message(reply("first"))
+    stub.add_message(reply("second"))
+    inbox = make_inbox(stub, state_path)
+    inbox.connect()
+    inbox.process_new_mail()
+    inbox.close()
+
+    # Unseen again, but below the persisted UID: must not be handed on twice.
+    stub.messages[0].flags.clear()
+    stub.add_message(reply("third"))
+    deliveries = Deliveries()
+    restarted = make_inbox(stub, state_path, deliver=deliveries)
+    assert restarted.state == MailboxState(uidvalidity=1000, last_uid=2)
+    restarted.connect()
+    try:
+        assert restarted.process_new_mail() == 1
+    finally:
+        restarted.close()
+    assert [r["message"] for r in deliveries.replies] == ["third"]
+    assert any(c.endswith("UID SEARCH UID 3:* UNSEEN") for c in stub.commands)
+
+
+def test_uidvalidity_change_resets_state(stub, state_path):
+    MailboxState(uidvalidity=999, last_uid=50).save(state_path)
+    stub.add_message(reply("after the reset"))
+    deliveries = Deliveries()
+    inbox = make_inbox(stub, state_path, deliver=deliveries)
+    inbox.connect()
+    try:
+        assert json.load(open(state_path)) == {"uidvalidity": 1000, "last_uid": 0}
+        assert inbox.process_new_mail() == 1
+    finally:
+        inbox.close()
+    assert [r["message"] for r in deliveries.replies] == ["after the reset"]
+
+    stub.renumber(1001)
+    inbox.connect()
+    try:
+        assert inbox.state == MailboxState(uidvalidity=1001, last_uid=0)
+        # Already \Seen, so the fresh pass finds nothing to deliver again.
+        assert inbox.process_new_mail() == 0
+    finally:
+        inbox.close()
+
+
+@pytest.mark.parametrize("with_continuation", [False, True])
+def test_idle_wakes_up_on_new_mail(stub, state_path, with_continuation):
+    stub.exists_with_continuation = with_continuation
+    inbox = make_inbox(stub, state_path)
+    inbox.connect()
+    try:
+        assert inbox.supports_idle
+        inbox.process_new_mail()
+        if not with_continuation:
+            threading.Timer(0.2, stub.add_message, [reply()]).start()
+        started = time.monotonic()
+        assert inbox.idle(10) is True
+        assert time.monotonic() - started < 5
+        assert stub.commands[-1] == "DONE"
+    finally:
+        inbox.close()
+
+
+def test_idle_times_out_and_interrupt_ends_it(stub, state_path):
+    inbox = make_inbox(stub, state_path)
+    inbox.connect()
+    try:
+        inbox.process_new_mail()
+        assert inbox.idle(0.2) is False
+        threading.Timer(0.2, inbox.interrupt).start()
+        started = time.monotonic()
+        assert inbox.idle(10) is False
+        assert time.monotonic() - started < 5
+        # The session is still usable after DONE.
+        assert inbox.mail.noop()[0] == "OK"
+    finally:
+        inbox.close()
+
+
+def test_reconnect_backoff_doubles_caps_and_resets(stub, state_path, monkeypatch):
+    inbox = make_inbox(stub, state_path, max_backoff_seconds=4)
+    outcomes = iter(["fail", "fail", "fail", "fail", "ok", "fail", "fail", "stop"])
+    connect = inbox.connect
+
+    def flaky_connect():
+        outcome = next(outcomes)
+        if outcome == "fail":
+            raise OSError("connection refused")
+        if outcome == "stop":
+            inbox.interrupt()
+            raise OSError("going away")
+        connect()
+
+    def drop_connection():
+        raise imaplib.IMAP4.abort("server went away")
+
+    pauses = []
+    monkeypatch.setattr(inbox, "connect", flaky_connect)
+    monkeypatch.setattr(inbox, "wait_for_mail", drop_connection)
+    monkeypatch.setattr(inbox, "pause", lambda seconds: pauses.append(seconds))
+
+    inbox.run_forever()
+
+    # The successful connect resets the delay; the dropped session then counts as a failure.
+    assert pauses == [1, 2, 4, 4, 1, 2, 4, 4]
+    assert inbox.reconnects == 8
+    assert inbox.last_error == "going away"
+    assert inbox.mail is None
+
+
+def make_service(stub, state_path):
+    settings = Settings(
+        supervisor_imap_host="127.0.0.1",
+        supervisor_imap_port=stub.port,
+        supervisor_imap_email="assistant",
+        supervisor_imap_app_password="secret",
+        supervisor_email=SUPERVISOR,
+        imap_ssl=False,
+        imap_state_path=state_path,
+    )
+    return SupervisorInboxService(settings)
+
+
+@pytest.fixture
+def stuck_service(stub, state_path, monkeypatch):
+    """A service whose wait step ignores interrupt() for a while, then uses the connection."""
+    service = make_service(stub, state_path)
+    inbox = service.inbox
+    step_started, step_done = threading.Event(), threading.Event()
+    closed_after_step = []
+
+    def stuck_wait():
+        step_started.set()
+        time.sleep(0.5)
+        inbox.mail.noop()
+        step_done.set()
+        inbox.pause(10)
+
+    close = inbox.close
+
+    def checked_close():
+        closed_after_step.append(step_done.is_set())
+        close()
+
+    monkeypatch.setattr(inbox, "wait_for_mail", stuck_wait)
+    monkeypatch.setattr(inbox, "close", checked_close)
+    service.step_started = step_started
+    service.closed_after_step = closed_after_step
+    return service
+
+
+def test_stop_timeout_does_not_log_out_under_a_running_step(stub, stuck_service):
+    service = stuck_service
+
+    async def run():
+        service.start()
+        task = service._task
+        await asyncio.to_thread(service.step_started.wait, 5)
+        await service.stop(timeout=0.05)
+        # Timed out, but the task was left to finish the step and log out.
+        assert not task.done()
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(run())
+    assert service.closed_after_step == [True]
+    assert service.inbox.last_error is None
+    assert [c.split(" ")[1] for c in stub.commands[-2:]] == ["NOOP", "LOGOUT"]
+
+
+def test_cancelled_run_waits_for_the_step_before_logging_out(stub, stuck_service):
+    service = stuck_service
+
+    async def run():
+        service.start()
+        task = service._task
+        await asyncio.to_thread(service.step_started.wait, 5)
+        # What the loop does to leftover tasks at shutdown.
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert service.closed_after_step == [True]
+    assert [c.split(" ")[1] for c in stub.commands[-2:]] == ["NOOP", "LOGOUT"]
@@ -8,6 +8,10 @@ type ChatMessage = {
   role: ChatRole
   text: string
   created_at: string
+  seq: number
+  rev: number
+  is_draft?: boolean
+  progress?: string | null
 }
 
 const API_BASE = import.meta.env.VITE_API_BASE_URL ?? 'http://localhost:8000/api'
@@ -23,27 +27,63 @@ export function Chat() {
 
   useEffect(() => {
     let cancelled = false
+    // Cursor and ETag of the last poll, so an idle conversation costs a 304
+    // and new activity only transfers the delta.
+    let lastRev = 0
+    let etag: string | null = null
 
     async function fetchMessages() {
       try {
         const res = await fetch(
-          `${API_BASE}/chat/${DEFAULT_CONVERSATION_ID}`,
+          `${API_BASE}/chat/${DEFAULT_CONVERSATION_ID}?since=${lastRev}`,
+          { headers: etag ? { 'If-None-Match': etag } : {} },
         )
-        if (!res.ok) return
+        if (res.status === 304 || !res.ok) return
         const data = await res.json()
-        if (!cancelled && data?.messages) {
-          setMessages(data.messages)
-        }
+        if (cancelled || !data?.messages) return
+        etag = res.headers.get('ETag')
+        lastRev = data.last_rev ?? lastRev
+        const incoming: ChatMessage[] = data.messages
+        if (incoming.length === 0) return
+        setMessages((prev) => mergeMessages(prev, incoming))
       } catch {
         // ignore network errors for demo
       }
     }
 
-    fetchMessages()
-    const id = setInterval(fetchMessages, pollIntervalMs)
+    // Prefer the server-push stream; fall back to polling only if the
+    // browser lacks EventSource or the stream is closed for good.
+    let pollId: ReturnType<typeof setInterval> | null = null
+    const startPolling = () => {
+      if (pollId !== null) return
+      fetchMessages()
+      pollId = setInterval(fetchMessages, pollIntervalMs)
+    }
+
+    let source: EventSource | null = null
+    if (typeof EventSource === 'undefined') {
+      startPolling()
+    } else {
+      source = new EventSource(
+        `${API_BASE}/chat/${DEFAULT_CONVERSATION_ID}/stream`,
+      )
+      source.addEventListener('message', (e) => {
+        if (cancelled) return
+        const message: ChatMessage = JSON.parse((e as MessageEvent).data)
+        lastRev = Math.max(lastRev, message.rev)
+        setMessages((prev) => mergeMessages(prev, [message]))
+      })
+      source.onerror = () => {
+        // EventSource reconnects on its own (resuming via Last-Event-ID)
+        // unless the server refused the stream outright.
+        if (source?.readyState === EventSource.CLOSED) startPolling()
+      }
+    }
+
     return () => {
       cancelled = true
-      clearInterval(id)
+      source?.close()
+      if (pollId !== null) clearInterval(pollId)
     }
   }, [])
 
@@ -81,12 +121,10 @@ export function Chat() {
     }
   }
 
+  // seq is the message's position in the conversation; it does not change
+  // when a streaming reply is updated.
   const groupedMessages = useMemo(
-    () => messages.sort(
-      (a, b) =>
-        new Date(a.created_at).getTime() -
-        new Date(b.created_at).getTime(),
-    ),
+    () => [...messages].sort((a, b) => a.seq - b.seq),
     [messages],
   )
 
@@ -126,6 +164,12 @@ export function Chat() {
   )
 }
 
+function mergeMessages(prev: ChatMessage[], incoming: ChatMessage[]) {
+  const byId = new Map(prev.map((m) => [m.id, m]))
+  for (const m of incoming) byId.set(m.id, m)
+  return Array.from(byId.values())
+}
+
 function MessageBubble({ message }: { message: ChatMessage }) {
   const isUser = message.role === 'user'
   const isSupervisor = message.role === 'supervisor'
@@ -156,6 +200,10 @@ function MessageBubble({ message }: { message: ChatMessage }) {
           <div className="bubble-text">{cleanedText}</div>
         )}
 
+        {message.is_draft && (
+          <div className="bubble-progress">{message.progress ?? 'typing...'}</div>
+        )}
+
         {imageUrls.length > 0 && (
           <div className="bubble-images">
             {imageUrls.map((url, idx) => (